@@ -23,8 +23,9 @@ class Command(Enum):
   NAV_COLLECT_SAMPLE  = 19,
   NAV_FLIP_ROCK       = 20,
   NAV_DROP_SAMPLE     = 21,
+  VISION_TELEMETRY    = 22,
 
-  EXIT                = 22
+  EXIT                = 23
 
 class Input:
   def __init__(self, name, type):
@@ -80,6 +81,8 @@ class RoverCommandLine:
       'nav-flip-rock': [ Command.NAV_FLIP_ROCK ],
       'nav-drop-sample': [ Command.NAV_DROP_SAMPLE ],
 
+      'vision-telemetry': [ Command.VISION_TELEMETRY ],
+
       'exit':      [ Command.EXIT ]
     }
 
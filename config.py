@@ -9,8 +9,28 @@ MAX_TRAVEL_TIME  = 5
 
 DIST_THRESH      = 10
 HEAD_THRESH      = 5
+ASSOC_GATE       = 1 # Furthest a detection is associated with an object, in units of the thresholds above, at most 1
 PRUNE_TIME       = 0.5
 
+# World frame map. Objects are kept where they were seen, relative to where
+# the rover started, using dead reckoning from the commanded motion. Their
+# confidence then fades instead of them being pruned after PRUNE_TIME.
+WORLD_MAP            = False
+ODOM_LINEAR          = 100             # cm/s per unit of commanded velocity, needs calibrating
+ODOM_ANGULAR         = math.degrees(1) # deg/s per unit of commanded angular velocity, needs calibrating
+CONFIDENCE_HALF_LIFE = 5               # Seconds
+MIN_CONFIDENCE       = 0.1             # Objects are removed below this
+
+# Kalman filter object positions. Between detections they are predicted
+# from the dead reckoned motion above, so control can run faster than vision.
+# Off until the odometry above is calibrated.
+FILTER_OBJECTS  = False
+RANGE_SD        = 3   # Detection distance error, cm
+BEARING_SD      = 1.5 # Detection heading error, degrees
+PROCESS_SD      = 1   # Drift of an object's estimate, cm per sqrt(second)
+ODOM_LINEAR_SD  = 0.1 # Dead reckoning error as a fraction of the distance travelled
+ODOM_ANGULAR_SD = 0.1 # Dead reckoning error as a fraction of the angle turned
+
 ROTATE_DEAD_ZONE = 6
 ROTATE_STOP      = 2.5
 
@@ -36,8 +56,25 @@ APPROACH_TIME_LANDER = 2.75
 
 DISC_TIMEOUT_SAMPLE  = 10
 
+VISION_DEBUG     = False # Render detections in a separate window
+VISION_PROCESSES = False # Run vision in worker processes instead of the navigation loop
+VISION_TRACKING  = 0     # Frames between full detections when tracking, 0 to detect every frame
+VISION_FPS       = 0     # Target frame rate for adaptive processing resolution, 0 for a fixed resolution
+VISION_PARAMS    = None  # e.g. 'vision_params.json', tuned colour ranges written by subsystems/vision/tune.py
+VISION_TELEMETRY = False # Keep per-stage latency histograms, shown by the vision-telemetry command
+
+CAMERA_RESOLUTION  = (640, 480)
+CAMERA_CALIBRATION = None # e.g. 'calibration.npz', written by subsystems/vision/calibration.py
+
 AVOID_MOVE_TIME = 2
 
+# Frames between detections of each object type, 0 to stop detecting it.
+# Types not listed are detected every frame. States that need an object
+# more often override these.
+DETECT_INTERVALS = {}
+DETECT_INTERVALS[ObjectType.LANDER] = 4
+DETECT_INTERVALS[ObjectType.WALL]   = 4
+
 AVOID_RADIUS = {}
 AVOID_RADIUS[ObjectType.OBSTACLE] = 17
 AVOID_RADIUS[ObjectType.SAMPLE]   = 6
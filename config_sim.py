@@ -9,8 +9,28 @@ MAX_TRAVEL_TIME  = 5
 
 DIST_THRESH = 10
 HEAD_THRESH = 5
+ASSOC_GATE  = 1 # Furthest a detection is associated with an object, in units of the thresholds above, at most 1
 PRUNE_TIME  = 0.5
 
+# World frame map. Objects are kept where they were seen, relative to where
+# the rover started, using dead reckoning from the commanded motion. Their
+# confidence then fades instead of them being pruned after PRUNE_TIME.
+WORLD_MAP            = False
+ODOM_LINEAR          = 100             # cm/s per m/s of commanded velocity
+ODOM_ANGULAR         = math.degrees(1) # deg/s per rad/s of commanded angular velocity
+CONFIDENCE_HALF_LIFE = 5               # Seconds
+MIN_CONFIDENCE       = 0.1             # Objects are removed below this
+
+# Kalman filter object positions. Between detections they are predicted
+# from the dead reckoned motion above, so control can run faster than vision.
+# Off until the odometry above is calibrated.
+FILTER_OBJECTS  = False
+RANGE_SD        = 3   # Detection distance error, cm
+BEARING_SD      = 1.5 # Detection heading error, degrees
+PROCESS_SD      = 1   # Drift of an object's estimate, cm per sqrt(second)
+ODOM_LINEAR_SD  = 0.1 # Dead reckoning error as a fraction of the distance travelled
+ODOM_ANGULAR_SD = 0.1 # Dead reckoning error as a fraction of the angle turned
+
 ROTATE_DEAD_ZONE = 6
 ROTATE_STOP      = 2.5
 
@@ -36,8 +56,21 @@ APPROACH_TIME_LANDER = 4
 
 DISC_TIMEOUT_SAMPLE  = 10 
 
+SIM_VISION       = False # Detect objects in the simulated camera image instead of using ground truth
+VISION_DEBUG     = False # Render detections in a separate window
+VISION_TELEMETRY = False # Keep per-stage latency histograms, shown by the vision-telemetry command
+
+CAMERA_CALIBRATION = None # Calibration of the simulated camera, see subsystems/vision/calibration.py
+
 AVOID_MOVE_TIME = 2
 
+# Frames between detections of each object type, 0 to stop detecting it.
+# Types not listed are detected every frame. States that need an object
+# more often override these.
+DETECT_INTERVALS = {}
+DETECT_INTERVALS[ObjectType.LANDER] = 4
+DETECT_INTERVALS[ObjectType.WALL]   = 4
+
 AVOID_RADIUS = {}
 AVOID_RADIUS[ObjectType.OBSTACLE] = 17
 AVOID_RADIUS[ObjectType.SAMPLE]   = 6
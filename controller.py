@@ -23,6 +23,7 @@ except (RuntimeError, ModuleNotFoundError) as ex:
 
 try:
   from subsystems.vision import vision
+  from subsystems.vision.pipeline import VisionPipeline
 except (RuntimeError, ModuleNotFoundError) as ex:
   has_vision = False
   print(ex)
@@ -36,6 +37,7 @@ except (RuntimeError, ModuleNotFoundError) as ex:
 class Controller:
   def __init__(self):
     self.detector = None
+    self.pipeline = None
     if has_mobility:
       mobility.initialze()
       print('Initializing mobility system')
@@ -48,8 +50,14 @@ class Controller:
     else:
       print('Failed to initialize collection system. Perhaps a module is missing')
 
-    if has_vision:
-      self.detector = vision.Initialize()
+    if has_vision and cfg.VISION_PROCESSES:
+      self.pipeline = VisionPipeline(resolution=cfg.CAMERA_RESOLUTION, calibration_path=cfg.CAMERA_CALIBRATION,
+                                     params_path=cfg.VISION_PARAMS, telemetry=cfg.VISION_TELEMETRY).start()
+      print('Initializing vision system (multi-process)')
+    elif has_vision:
+      self.detector = vision.Initialize(debug=cfg.VISION_DEBUG, tracking=cfg.VISION_TRACKING,
+                                        calibration_path=cfg.CAMERA_CALIBRATION, target_fps=cfg.VISION_FPS,
+                                        params_path=cfg.VISION_PARAMS, telemetry=cfg.VISION_TELEMETRY)
       print('Initializing vision system')
     else:
       print('Failed to initialize vision system. Perhaps a module is missing')
@@ -61,6 +69,9 @@ class Controller:
       print('Faield to initialize status system. Perhaps a module is missing')
 
   def __del__(self):
+    if self.pipeline is not None:
+      self.pipeline.stop()
+
     if has_scs:
       scs.shutdown()
 
@@ -83,10 +94,32 @@ class Controller:
       print('Cannot Set Status. Status system not available.')
 
   def get_detected_objects(self):
+    # None when the pipeline has not published a new frame since the last call
+    if self.pipeline is not None:
+      return self.pipeline.latest()
     if has_vision and self.detector is not None:
       return vision.ObjectDetection(self.detector)
     else:
-      print('Cannot Set Motors. Mobility system not available.')
+      print('Cannot Detect Objects. Vision system not available.')
+      return interop.detection_batch()
+
+  def set_detect_intervals(self, intervals):
+    if self.pipeline is not None:
+      self.pipeline.set_schedule(intervals)
+    elif has_vision and self.detector is not None:
+      vision.SetSchedule(intervals)
+
+  def print_vision_telemetry(self, verbose=True):
+    if self.pipeline is not None:
+      report = self.pipeline.telemetry()
+    else:
+      report = vision.Telemetry() if has_vision else None
+    if report is not None:
+      print(report)
+    elif verbose and cfg.VISION_TELEMETRY:
+      print('No vision telemetry yet.')
+    elif verbose:
+      print('No vision telemetry. Set VISION_TELEMETRY in the config to record it.')
 
   def set_motors(self, vel, ang):
     if has_mobility:
@@ -1,30 +1,41 @@
 
-from subsystems.interop import SCS_ACTION, DetectedObject, Status
+from subsystems.interop import SCS_ACTION, OBJECT_CODES, Status, detection_batch
 from subsystems.navigation import env_params
 from subsystems.navigation.env_params import ObjectType
 from subsystems.navigation.navigation import Navigator
 from subsystems.vrep.roverbot_lib import *
 
 import time
+import numpy as np
 import config_sim as cfg
 
+if cfg.SIM_VISION:
+  from subsystems.vision import vision
+  from subsystems.vision.sources import SimCameraSource
+
 sceneParameters = SceneParameters()
 robotParameters = RobotParameters()
 robotParameters.driveType = 'differential'
 
-def to_detected_objects(object_type, object_list):
-  if object_list == None:
-    return []
-
-  detected_objects = []
-  if len(object_list) > 0:
-    if isinstance(object_list[0], list):
-      for o in object_list:
-        detected_objects.append(DetectedObject(object_type, math.degrees(o[1]), o[0] * env_params.meter_scale, 0))
-    else:
-      detected_objects.append(DetectedObject(object_type, math.degrees(object_list[1]), object_list[0] * env_params.meter_scale, 1))
-
-  return detected_objects
+def to_detected_objects(object_type, object_list, timestamp):
+  # Fills a detection batch from the simulator's [range, bearing] lists
+  if object_list == None or len(object_list) == 0:
+    return detection_batch()
+
+  if isinstance(object_list[0], list):
+    angle = 0
+  else:
+    object_list = [ object_list ]
+    angle = 1
+
+  ranges = np.array(object_list, dtype=np.float64)
+  batch  = detection_batch(len(ranges))
+  batch['type']      = OBJECT_CODES[object_type]
+  batch['heading']   = np.degrees(ranges[:, 1])
+  batch['distance']  = ranges[:, 0] * env_params.meter_scale
+  batch['angle']     = angle
+  batch['timestamp'] = timestamp
+  return batch
 
 class Controller:
   def __init__(self, ip):
@@ -36,6 +47,14 @@ class Controller:
     self.vel = 0
     self.ang = 0
 
+    # Run the rover's vision on the simulated camera instead of using the
+    # simulator's ground truth. Not threaded, the remote API is not safe to
+    # call from two threads.
+    self.detector = None
+    if cfg.SIM_VISION:
+      self.detector = vision.Initialize(SimCameraSource(self.sim), threaded=False, debug=cfg.VISION_DEBUG,
+                                        calibration_path=cfg.CAMERA_CALIBRATION, telemetry=cfg.VISION_TELEMETRY)
+
   def config(self):
     return cfg
 
@@ -43,13 +62,29 @@ class Controller:
     _, _, _, _ = self.sim.UpdateObjectPositions()
 
   def get_detected_objects(self):
+    if self.detector is not None:
+      return vision.ObjectDetection(self.detector)
+
     sample, lander, obstacle, rock = self.sim.GetDetectedObjects()
-    visible_objects = []
-    visible_objects = visible_objects + to_detected_objects(ObjectType.ROCK,     rock)
-    visible_objects = visible_objects + to_detected_objects(ObjectType.SAMPLE,   sample)
-    visible_objects = visible_objects + to_detected_objects(ObjectType.OBSTACLE, obstacle)
-    visible_objects = visible_objects + to_detected_objects(ObjectType.LANDER,   lander)
-    return visible_objects
+    timestamp = time.time()
+    return np.concatenate([
+      to_detected_objects(ObjectType.ROCK,     rock,     timestamp),
+      to_detected_objects(ObjectType.SAMPLE,   sample,   timestamp),
+      to_detected_objects(ObjectType.OBSTACLE, obstacle, timestamp),
+      to_detected_objects(ObjectType.LANDER,   lander,   timestamp),
+    ])
+
+  def set_detect_intervals(self, intervals):
+    # Ground truth detections cost nothing, only the simulated camera is scheduled
+    if self.detector is not None:
+      vision.SetSchedule(intervals)
+
+  def print_vision_telemetry(self, verbose=True):
+    report = vision.Telemetry() if self.detector is not None else None
+    if report is not None:
+      print(report)
+    elif verbose:
+      print('No vision telemetry. Set SIM_VISION and VISION_TELEMETRY in the config to record it.')
 
   def set_motors(self, vel, ang):
     self.sim.SetTargetVelocities(vel, ang)
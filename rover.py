@@ -108,6 +108,8 @@ def run(controller):
       navigate(navigator, nav.FlipRock, nav.DiscoverSample)
     elif cmd_id == cmdline.Command.NAV_DROP_SAMPLE:
       navigate(navigator, nav.NavLander, nav.DiscoverSampleOrRock)
+    elif cmd_id == cmdline.Command.VISION_TELEMETRY:
+      controller.print_vision_telemetry()
     elif cmd_id == cmdline.Command.EXIT:
       break
 
@@ -133,3 +135,4 @@ if __name__ == "__main__":
     # Always stop the motors
     print('Shutting down...')
     controller.set_motors(0, 0)
+    controller.print_vision_telemetry(verbose=False)
@@ -3,6 +3,8 @@ from enum import Enum
 from math import radians
 from math import degrees
 
+import numpy as np
+
 class SCS_ACTION(Enum):
   NONE                = 0,
   DROP_SAMPLE         = 1,
@@ -35,6 +37,46 @@ class DetectedObject:
     self.angle          = angle
     self.last_detected  = 0
     self.first_detected = 0
+    self.x              = 0 # World position when the map is in the world frame
+    self.y              = 0
+    self.confidence     = 1
+    self.id             = None # Assigned by the ObjectMap, stable while it is mapped
+    self.filter         = None # Position filter, when the ObjectMap filters objects
+    self.track          = NO_TRACK # Vision track it was last detected as
 
   def __str__(self):
     return '(type:{}, angle: {}d, dist: {})'.format(self.type, self.heading, self.distance)
+
+# Detections from one frame as a structured array, one row per object. type
+# indexes OBJECT_TYPES and timestamp is the capture time of the frame. track
+# identifies the same object across frames when vision is tracking, and is
+# NO_TRACK otherwise.
+OBJECT_TYPES = list(ObjectType)
+OBJECT_CODES = { t: i for i, t in enumerate(OBJECT_TYPES) }
+NO_TRACK     = -1
+
+DETECTION = np.dtype([
+  ('type',      np.uint8),
+  ('heading',   np.float32),
+  ('distance',  np.float32),
+  ('angle',     np.float32),
+  ('timestamp', np.float64),
+  ('track',     np.int32),
+])
+
+def detection_batch(count=0):
+  batch = np.zeros(count, dtype=DETECTION)
+  batch['track'] = NO_TRACK
+  return batch
+
+def to_detection_batch(objects, timestamp, tracks=None):
+  # Builds a batch from DetectedObjects, with their track ids if given
+  batch = detection_batch(len(objects))
+  for i, o in enumerate(objects):
+    track    = tracks[i] if tracks is not None else NO_TRACK
+    batch[i] = (OBJECT_CODES[o.type], o.heading, o.distance, o.angle, timestamp, track)
+  return batch
+
+def from_detection_batch(batch):
+  return [ DetectedObject(OBJECT_TYPES[r['type']], float(r['heading']), float(r['distance']), float(r['angle']))
+           for r in batch ]
@@ -1,21 +1,46 @@
-from ..interop import SCS_ACTION, DetectedObject, ObjectType, Status
+from ..interop import NO_TRACK, OBJECT_TYPES, SCS_ACTION, DetectedObject, ObjectType, Status
 
+from .object_filter import PositionFilter, polar_covariance
+from .object_index import PolarGrid, polar_distance
 from vector_2d import *
 
 from enum import Enum
 
+import numpy as np
+import heapq
+import itertools
 import queue
 import math
 import time
 
+has_scipy = True
+
+try:
+  from scipy.optimize import linear_sum_assignment
+except ModuleNotFoundError:
+  has_scipy = False
+
 cfg = None
 
+# Cost given to pairs outside the association gate
+GATED = 1e6
+
 def sign(x): return -1 if x < 0 else 1 
 
 class ObjectMap:
-  def __init__(self):
-    self.__objects = []
-    self.__groups  = {}
+  def __init__(self, world=False, filtered=False):
+    self.world         = world    # Keep objects in the world frame, see cfg.WORLD_MAP
+    self.filtered      = filtered # Kalman filter object positions, see cfg.FILTER_OBJECTS
+    self.last_predict  = time.time()
+    self.__objects     = {}    # id -> object, insertion ordered
+    self.__tracks      = {}    # Vision track id -> object
+    self.__groups      = {}    # ObjectType -> { id -> object }
+    self.__ids         = itertools.count()
+    self.__index       = {}    # ObjectType -> PolarGrid
+    self.__expiry      = []    # Heap of (expiry time, count, object, last_detected)
+    self.__count       = itertools.count()
+    self.__prune_times = {}
+    self.__half_lives  = {}
 
   @staticmethod
   def is_same(a, b):
@@ -35,31 +60,46 @@ class ObjectMap:
 
   @staticmethod
   def distance(a, b):
-    return abs(ObjectMap.cartesian(a) - ObjectMap.cartesian(b))
+    return polar_distance(a.distance, a.heading, b.distance, b.heading)
+
+  @staticmethod
+  def to_world(o, pose):
+    # Sets o's world position from its heading and distance seen from pose,
+    # an (x, y, yaw) in cm and degrees
+    bearing = math.radians(pose[2] + o.heading)
+    o.x = pose[0] + o.distance * math.cos(bearing)
+    o.y = pose[1] + o.distance * math.sin(bearing)
+
+  @staticmethod
+  def measure(o, pose):
+    # Covariance of o's world position from a single detection
+    return polar_covariance(o.distance, pose[2] + o.heading, cfg.RANGE_SD, cfg.BEARING_SD)
+
+  @staticmethod
+  def to_relative(o, pose):
+    # Sets o's heading and distance as seen from pose
+    dx = o.x - pose[0]
+    dy = o.y - pose[1]
+    o.distance = math.hypot(dx, dy)
+    o.heading  = (math.degrees(math.atan2(dy, dx)) - pose[2] + 180) % 360 - 180
 
   def objects(self, type=None):
     if type is None:
-      return self.__objects
+      return self.__objects.values()
     elif type in self.__groups:
-      return self.__groups[type]
+      return self.__groups[type].values()
     else:
       return []
 
-  def find(self, query):
-    for o in self.objects(query.type):
-      if ObjectMap.is_same(o, query):
-        return o
-    return None
+  def get(self, id):
+    # The object with a stable id, None once it has been removed
+    return self.__objects.get(id)
 
   def closest(self, query):
-    min_dist = 1000000
-    closest  = None
-    for o in self.objects(query.type):
-      dist = ObjectMap.distance(o, query)
-      if dist < min_dist:
-        closest = o
-        min_dist = dist
-    return closest
+    index = self.__index.get(query.type)
+    if index is None:
+      return None
+    return index.nearest(query.distance, query.heading)
 
   def most_recent_of_type(self, type):
     max_time = 0
@@ -71,52 +111,226 @@ class ObjectMap:
     return recent
 
   def closest_of_type(self, type):
-    min_dist = 1000000
-    closest  = None
-    for o in self.objects(type):
-      dist = o.distance
-      if dist < min_dist:
-        closest = o
-        min_dist = dist
-    return closest
+    if type is not None:
+      index = self.__index.get(type)
+      return index.nearest_to_rover() if index is not None else None
+
+    closest = [ index.nearest_to_rover() for index in self.__index.values() ]
+    closest = [ o for o in closest if o is not None ]
+    return min(closest, key=lambda o: o.distance) if len(closest) > 0 else None
 
   def add(self, o):
     if o.type not in self.__groups:
-      self.__groups[o.type] = [ o ]
-    else:
-      self.__groups[o.type].append(o)
-    self.__objects.append(o)
+      self.__groups[o.type] = {}
+      self.__index[o.type]  = PolarGrid(cfg.DIST_THRESH, cfg.HEAD_THRESH)
+    o.id = next(self.__ids)
+    self.__groups[o.type][o.id] = o
+    self.__index[o.type].add(o)
+    self.__objects[o.id] = o
+    self.schedule(o)
 
   def rem(self, o):
-    self.__objects.remove(o)
-    self.__groups[o.type].remove(o)
-
-  def update(self, visible):
-    # Add/update visible objects
-    cur_time = time.time()
-    for o in visible:
-      o.first_detected = cur_time
-      o.last_detected  = cur_time
-      found = self.find(o)
-      if found:
-        found.type          = o.type
-        found.heading       = o.heading
-        found.distance      = o.distance
-        found.angle         = o.angle
-        found.last_detected = o.last_detected
-      else:
-        self.add(o)
+    # Its expiry entries are left in the heap and skipped when popped
+    del self.__objects[o.id]
+    del self.__groups[o.type][o.id]
+    self.__index[o.type].remove(o)
+    if self.__tracks.get(o.track) is o:
+      del self.__tracks[o.track]
+
+  def reproject(self, pose):
+    # Moves every world frame object to where it is seen from pose
+    now = time.time()
+    for o in self.objects():
+      ObjectMap.to_relative(o, pose)
+      self.__index[o.type].move(o)
+      if self.world:
+        o.confidence = 0.5 ** ((now - o.last_detected) / self.__half_lives.get(o.type, cfg.CONFIDENCE_HALF_LIFE))
+
+  def predict(self, travelled, turned):
+    # Widens every filter by the process noise since the last predict and by
+    # the odometry error of the rover travelling (cm) and turning (degrees).
+    # Turning error moves farther objects more.
+    now = time.time()
+    dt  = now - self.last_predict
+    self.last_predict = now
+
+    var  = cfg.PROCESS_SD ** 2 * dt + (cfg.ODOM_LINEAR_SD * travelled) ** 2
+    turn = math.radians(cfg.ODOM_ANGULAR_SD * turned) ** 2
+    for o in self.objects():
+      o.filter.predict(var + turn * o.distance ** 2)
+
+  @staticmethod
+  def cost(distance_a, heading_a, distance_b, heading_b):
+    # Association cost, the larger gap in units of its threshold, so a gate
+    # of 1 is the is_same box. Works on arrays.
+    return np.maximum(np.abs(distance_a - distance_b) / cfg.DIST_THRESH,
+                      np.abs(heading_a - heading_b) / cfg.HEAD_THRESH)
+
+  @staticmethod
+  def associate(distance, heading, known):
+    # Pairs detections with known objects of one type, as (detection,
+    # object) indices, minimising the total cost over pairs within the gate.
+    # Uses the Hungarian method when scipy is available, otherwise takes the
+    # cheapest remaining pair first.
+    if len(known) == 0:
+      return []
+
+    cost = ObjectMap.cost(distance[:, None], heading[:, None],
+                          np.array([ o.distance for o in known ]), np.array([ o.heading for o in known ]))
+    if has_scipy:
+      rows, cols = linear_sum_assignment(np.where(cost <= cfg.ASSOC_GATE, cost, GATED))
+      return [ (i, j) for i, j in zip(rows.tolist(), cols.tolist()) if cost[i, j] <= cfg.ASSOC_GATE ]
+
+    pairs     = []
+    used_rows = set()
+    used_cols = set()
+    order     = np.argsort(cost, axis=None)
+    for i, j in zip(*np.unravel_index(order[cost.flat[order] <= cfg.ASSOC_GATE], cost.shape)):
+      i, j = int(i), int(j)
+      if i not in used_rows and j not in used_cols:
+        pairs.append((i, j))
+        used_rows.add(i)
+        used_cols.add(j)
+    return pairs
+
+  def update(self, visible, pose=None, motion=(0, 0)):
+    # Add/update visible objects from an interop DETECTION batch. Detections
+    # vision tracked as an object the map already holds update that object.
+    # The rest of each type are associated as a whole, against the objects
+    # the index finds near any of them. pose is the rover's dead reckoned pose and motion
+    # the distance (cm) and angle (degrees) it has moved through since the
+    # last update, used by the world frame map and the filters. visible is
+    # None when vision has no new frame, which only moves and prunes the map.
+    if self.filtered:
+      self.predict(*motion)
+    if self.world or self.filtered:
+      self.reproject(pose)
+
+    if visible is None:
+      self.prune()
+      return
+
+    for code in np.unique(visible['type']).tolist():
+      type     = OBJECT_TYPES[code]
+      rows     = visible[visible['type'] == code]
+      index    = self.__index.get(type)
+      distance = rows['distance'].astype(np.float64)
+      heading  = rows['heading'].astype(np.float64)
+      tracks   = rows['track'].tolist()
+
+      matched = {}
+      for i, track in enumerate(tracks):
+        o = self.__tracks.get(track) if track != NO_TRACK else None
+        if o is not None and o.type == type:
+          matched[i] = o
+
+      rest  = [ i for i in range(len(rows)) if i not in matched ]
+      taken = set(matched.values())
+      known = []
+      if index is not None:
+        known = list(dict.fromkeys(o for i in rest for o in index.near(distance[i], heading[i]) if o not in taken))
+      for i, j in ObjectMap.associate(distance[rest], heading[rest], known):
+        matched[rest[i]] = known[j]
+
+      # Matched detections first, so an unmatched one within the gate of a
+      # detection already applied from this batch is known to be a second
+      # sighting of the same object rather than a new one
+      values  = list(zip(rows['heading'].tolist(), rows['distance'].tolist(),
+                         rows['angle'].tolist(), rows['timestamp'].tolist()))
+      applied = []
+      for i in sorted(range(len(rows)), key=lambda i: i not in matched):
+        heading, distance, angle, timestamp = values[i]
+        found = matched.get(i)
+        track = tracks[i]
+        if found is None:
+          if any(ObjectMap.cost(distance, heading, d, h) <= cfg.ASSOC_GATE for d, h in applied):
+            continue
+          applied.append((distance, heading))
+          o = DetectedObject(type, heading, distance, angle)
+          o.first_detected = timestamp
+          o.last_detected  = timestamp
+          if self.world or self.filtered:
+            ObjectMap.to_world(o, pose)
+          if self.filtered:
+            o.filter = PositionFilter(o.x, o.y, ObjectMap.measure(o, pose))
+          self.add(o)
+          self.set_track(o, track)
+          continue
+
+        applied.append((distance, heading))
+        found.angle         = angle
+        found.last_detected = timestamp
+        found.confidence    = 1
+        if self.filtered:
+          # Fold the detection into the estimate, then see it from the rover
+          z = DetectedObject(type, heading, distance, angle)
+          ObjectMap.to_world(z, pose)
+          found.filter.update(z.x, z.y, ObjectMap.measure(z, pose))
+          found.x, found.y = found.filter.mean.tolist()
+          ObjectMap.to_relative(found, pose)
+        else:
+          found.heading  = heading
+          found.distance = distance
+          if self.world:
+            ObjectMap.to_world(found, pose)
+        self.__index[found.type].move(found)
+        self.schedule(found)
+        self.set_track(found, track)
     self.prune()
 
-  def prune(self):
-    # Remove old entries
-    to_remove = []
+  def set_track(self, o, track):
+    if track == NO_TRACK:
+      return
+    if self.__tracks.get(o.track) is o:
+      del self.__tracks[o.track]
+    o.track = track
+    self.__tracks[track] = o
+
+  def set_detect_intervals(self, intervals):
+    # Objects detected less often are kept for proportionally longer. Types
+    # that are not being detected at all keep their last known entries.
+    self.__prune_times = {}
+    self.__half_lives  = {}
+    for type, interval in intervals.items():
+      self.__prune_times[type] = cfg.PRUNE_TIME * interval if interval > 0 else math.inf
+      self.__half_lives[type]  = cfg.CONFIDENCE_HALF_LIFE * interval if interval > 0 else math.inf
+    self.reschedule()
+
+  def expiry(self, o):
+    # Time o is removed at unless it is detected again. The world frame map
+    # keeps it until its confidence falls below cfg.MIN_CONFIDENCE.
+    if self.world:
+      half_life = self.__half_lives.get(o.type, cfg.CONFIDENCE_HALF_LIFE)
+      return o.last_detected + half_life * math.log2(1 / cfg.MIN_CONFIDENCE)
+    return o.last_detected + self.__prune_times.get(o.type, cfg.PRUNE_TIME)
+
+  def schedule(self, o):
+    # Entries pushed before o was last detected become stale
+    expiry = self.expiry(o)
+    if expiry < math.inf:
+      heapq.heappush(self.__expiry, (expiry, next(self.__count), o, o.last_detected))
+
+  def reschedule(self):
+    # Rebuilds the heap from the live objects, dropping stale entries
+    self.__expiry = []
     for o in self.objects():
-      if time.time() - o.last_detected > cfg.PRUNE_TIME:
-        to_remove.append(o)
+      expiry = self.expiry(o)
+      if expiry < math.inf:
+        self.__expiry.append((expiry, next(self.__count), o, o.last_detected))
+    heapq.heapify(self.__expiry)
 
-    for o in to_remove:
-      self.rem(o)
+  def prune(self):
+    # Remove expired entries, skipping those for objects that have since
+    # been removed or detected again
+    now = time.time()
+    while len(self.__expiry) > 0 and self.__expiry[0][0] < now:
+      _, _, o, last_detected = heapq.heappop(self.__expiry)
+      if self.__objects.get(o.id) is o and o.last_detected == last_detected:
+        self.rem(o)
+
+    # Objects detected every frame leave a stale entry each time
+    if len(self.__expiry) > 2 * len(self.__objects) + 64:
+      self.reschedule()
 
 class StateTransition(Enum):
   RECORD_STATE = 0,
@@ -137,6 +351,7 @@ class State:
     self.obstacle           = None
     self.obstacle_detected_time = 0
     self.ignore_dead_zone   = False
+    self.detect_intervals   = dict(cfg.DETECT_INTERVALS) # Frames between detections of each ObjectType
 
   def is_first_update(self):
     return self.state_first_update
@@ -256,6 +471,7 @@ class DiscoverLander(DiscoverBase):
     super().__init__(navigator)
     self.move_speed   = cfg.MOVE_SPEED_FAST
     self.rotate_speed = cfg.ROTATE_SPEED_FAST
+    self.detect_intervals[ObjectType.LANDER] = 1
 
   def update(self):
     # Check finish conditions
@@ -276,20 +492,26 @@ class ObjectTargetState(State):
     self.target_last_detected_time = time.time()
 
   def update_target(self):
-    # Get the most recently detected object of the target type
-    most_recent = self.map.closest_of_type(self.target_type)
-    if most_recent is not None:
+    # Stay locked on the object targeted so far, which may have been chosen
+    # by a previous state, while it is in the map. Otherwise take the
+    # closest object of the target type.
+    target = self.map.get(self.navigator.target_id)
+    if target is None or target.type != self.target_type:
+      target = self.map.closest_of_type(self.target_type)
+    if target is not None:
       if self.target_object is None:
         self.target_dist = 10000 # Update target distance
-      self.target_object = most_recent
+      self.target_object       = target
+      self.navigator.target_id = target.id
 
     # If we are avoiding an obstacle delay pruning of the target object
-    if most_recent is not None or self.obstacle is not None:
+    if target is not None or self.obstacle is not None:
       self.target_last_detected_time = time.time()
 
     # Check if we haven't detected a target for an extended period of time
     if time.time() - self.target_last_detected_time > 10:
-      self.target_object = None # We lost the target
+      self.target_object       = None # We lost the target
+      self.navigator.target_id = None
       
     if self.target_object is not None:
       self.target_dist = min(self.target_dist, self.target_object.distance)
@@ -342,6 +564,7 @@ class NavLander(ObjectTargetState):
     super().__init__(navigator, ObjectType.LANDER)
     self.move_speed = cfg.MOVE_SPEED_MED
     self.rotate_speed = cfg.ROTATE_SPEED_FAST
+    self.detect_intervals[ObjectType.LANDER] = 1
 
   def update(self):
     self.update_target()
@@ -365,6 +588,7 @@ class DropSampleLookat(ObjectTargetState):
     self.rotate_speed = cfg.ROTATE_SPEED_MED
     self.move_speed   = 0
     self.ignore_dead_zone = True
+    self.detect_intervals[ObjectType.LANDER] = 1
 
   def update(self):
     self.update_target()
@@ -383,6 +607,7 @@ class DropSampleApproach(ObjectTargetState):
     super().__init__(navigator, ObjectType.LANDER)
     self.move_speed   = cfg.MOVE_SPEED_FAST
     self.rotate_speed = 0
+    self.detect_intervals[ObjectType.LANDER] = 1
 
   def update(self):
     self.update_target()
@@ -450,9 +675,9 @@ class FlipRock(ObjectTargetState):
 
   def update(self):
     self.controller.perform_action(SCS_ACTION.FLIP_ROCK)
-    self.controller.set_motors(-cfg.MOVE_SPEED_MED, 0)
+    self.navigator.set_motors(-cfg.MOVE_SPEED_MED, 0)
     time.sleep(1.2)
-    self.controller.set_motors(0, 0)
+    self.navigator.set_motors(0, 0)
     return DiscoverSample(self.navigator), None
 
 # ///////////////////////////////////////////////////////////
@@ -519,11 +744,17 @@ class Navigator:
     cfg = controller.config()
 
     self.controller  = controller
-    self.map         = ObjectMap()
+    self.map         = ObjectMap(cfg.WORLD_MAP, cfg.FILTER_OBJECTS)
     self.state       = None
     self.state_stack = queue.LifoQueue()
     self.last_update = time.time()
     self.rotate      = False
+    self.pose        = [ 0, 0, 0 ] # Dead reckoned x, y (cm) and yaw (degrees)
+    self.command     = (0, 0)      # Last commanded vel, ang
+    self.target_id   = None        # Map id of the object the states are locked on to
+    self.last_odom   = time.time()
+    self.travelled   = 0           # Distance (cm) and angle (degrees) moved through since the last map update
+    self.turned      = 0
 
     controller.travel_position_open()
 
@@ -539,11 +770,14 @@ class Navigator:
     self.controller.update()
 
     object_list = self.controller.get_detected_objects()
+    self.dead_reckon()
 
     if time.time() - self.start_time < 3: # Wait 3 seconds before starting
       return None
 
-    self.map.update(object_list)
+    self.map.update(object_list, self.pose, (self.travelled, self.turned))
+    self.travelled = 0
+    self.turned    = 0
 
     if self.state is not None:
       if self.state.is_first_update():
@@ -565,7 +799,7 @@ class Navigator:
     self.last_update = update_time
 
     if self.state is None:
-      self.controller.set_motors(0, 0)
+      self.set_motors(0, 0)
       return
 
     target_dist  = self.state.target_dist
@@ -594,8 +828,30 @@ class Navigator:
 
     # print('dist: {}, head: {}, vel: {}, ang: {}'.format(target_dist, target_head, vel, ang))
 
+    self.set_motors(vel, ang)
+
+  def set_motors(self, vel, ang):
+    # Motor commands go through here so the pose follows them
+    self.dead_reckon()
+    self.command = (vel, ang)
     self.controller.set_motors(vel, ang)
 
+  def dead_reckon(self):
+    # Advances the pose by the commanded motion since the last call
+    update_time = time.time()
+    dt = update_time - self.last_odom
+    self.last_odom = update_time
+
+    vel, ang = self.command
+    move     = vel * cfg.ODOM_LINEAR * dt
+    turn     = ang * cfg.ODOM_ANGULAR * dt
+    yaw      = math.radians(self.pose[2] + turn / 2)
+    self.pose[0] += move * math.cos(yaw)
+    self.pose[1] += move * math.sin(yaw)
+    self.pose[2]  = (self.pose[2] + turn + 180) % 360 - 180
+    self.travelled += abs(move)
+    self.turned    += abs(turn)
+
   # ///////////////////////////////////////////////////////////
   # STATE MANAGEMENT
 
@@ -614,8 +870,10 @@ class Navigator:
 
     print('State Changed > {}'.format(new_state))
     self.state = new_state
+    self.map.set_detect_intervals(new_state.detect_intervals)
+    self.controller.set_detect_intervals(new_state.detect_intervals)
     self.keep_target = False
     self.state_start_time   = time.time()
     self.state_first_update = True
-    self.controller.set_motors(0, 0)
+    self.set_motors(0, 0)
     return True
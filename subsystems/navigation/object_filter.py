@@ -0,0 +1,33 @@
+import numpy as np
+import math
+
+def polar_covariance(distance, bearing, range_sd, bearing_sd):
+  # Covariance of a point measured at distance and bearing (degrees), as
+  # independent range and bearing errors rotated into x/y. The distance is
+  # floored at 1 cm so the covariance stays invertible.
+  theta = math.radians(bearing)
+  c, s  = math.cos(theta), math.sin(theta)
+  rot   = np.array([ [ c, -s ], [ s, c ] ])
+  var   = np.diag([ range_sd ** 2, (max(distance, 1) * math.radians(bearing_sd)) ** 2 ])
+  return rot @ var @ rot.T
+
+class PositionFilter:
+  '''
+  Kalman filter for the world position of an object that does not move.
+  The rover's commanded motion enters through its dead reckoned pose, which
+  predicts where the object is seen from between detections. The odometry
+  error that motion adds is process noise, so a detection after driving or
+  turning outweighs the old estimate.
+  '''
+  def __init__(self, x, y, cov):
+    self.mean = np.array([ x, y ], dtype=np.float64)
+    self.cov  = cov
+
+  def predict(self, var):
+    # var is the variance added since the last predict, in cm^2
+    self.cov = self.cov + np.eye(2) * var
+
+  def update(self, x, y, cov):
+    gain      = self.cov @ np.linalg.inv(self.cov + cov)
+    self.mean = self.mean + gain @ (np.array([ x, y ]) - self.mean)
+    self.cov  = (np.eye(2) - gain) @ self.cov
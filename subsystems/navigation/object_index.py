@@ -0,0 +1,77 @@
+import math
+
+def polar_distance(d1, h1, d2, h2):
+  # Straight line distance between two (distance, heading in degrees) points
+  return math.sqrt(max(0, d1 * d1 + d2 * d2 - 2 * d1 * d2 * math.cos(math.radians(h1 - h2))))
+
+class PolarGrid:
+  '''
+  Buckets the objects of one type into cells by distance band and heading
+  sector. With cells as large as the association thresholds, anything that
+  is_same as a query lies in the query's cell or one of its neighbours.
+  '''
+  def __init__(self, band_size, sector_size):
+    self.band_size   = band_size
+    self.sector_size = sector_size
+    self.bands       = {} # band -> { sector -> [ objects ] }
+    self.cell_of     = {} # object -> (band, sector)
+
+  def __len__(self):
+    return len(self.cell_of)
+
+  def key(self, distance, heading):
+    return int(distance // self.band_size), int(heading // self.sector_size)
+
+  def add(self, o):
+    band, sector = self.key(o.distance, o.heading)
+    self.bands.setdefault(band, {}).setdefault(sector, []).append(o)
+    self.cell_of[o] = (band, sector)
+
+  def remove(self, o):
+    band, sector = self.cell_of.pop(o)
+    cells = self.bands[band]
+    cells[sector].remove(o)
+    if len(cells[sector]) == 0:
+      del cells[sector]
+      if len(cells) == 0:
+        del self.bands[band]
+
+  def move(self, o):
+    # Call after changing an object's distance or heading
+    if self.key(o.distance, o.heading) != self.cell_of[o]:
+      self.remove(o)
+      self.add(o)
+
+  def near(self, distance, heading):
+    # Objects in the cell around (distance, heading) and its neighbours
+    band, sector = self.key(distance, heading)
+    for b in range(band - 1, band + 2):
+      cells = self.bands.get(b)
+      if cells is None:
+        continue
+      for s in range(sector - 1, sector + 2):
+        yield from cells.get(s, ())
+
+  def nearest_to_rover(self):
+    # The object with the smallest distance is in the lowest occupied band
+    if len(self.bands) == 0:
+      return None
+    cells = self.bands[min(self.bands)]
+    return min((o for cell in cells.values() for o in cell), key=lambda o: o.distance)
+
+  def nearest(self, distance, heading):
+    # Searches bands outwards from the query's. An object in a band n bands
+    # away is at least (n - 1) bands from the query, so stop once that
+    # exceeds the best found.
+    band      = self.key(distance, heading)[0]
+    best      = None
+    best_dist = math.inf
+    for b in sorted(self.bands, key=lambda b: abs(b - band)):
+      if (abs(b - band) - 1) * self.band_size > best_dist:
+        break
+      for cell in self.bands[b].values():
+        for o in cell:
+          dist = polar_distance(o.distance, o.heading, distance, heading)
+          if dist < best_dist:
+            best, best_dist = o, dist
+    return best
@@ -0,0 +1,85 @@
+'''
+Offline detection over stacks of recorded frames.
+
+  python -m subsystems.vision.batch <corpus> [--chunk N] [--processes N] [--output out.npy]
+
+Frames are split into chunks that a pool of worker processes detect
+independently. Workers get the frames once when they start, inherited on
+fork or memory-mapped from the raw frame file, so only chunk bounds and
+result rows cross the pool.
+'''
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from ..interop import OBJECT_CODES, OBJECT_TYPES
+from . import vision
+
+# One row per detection. type indexes interop.OBJECT_TYPES.
+BATCH_RECORD = np.dtype([
+    ('frame',       np.int32),
+    ('type',        np.uint8),
+    ('bearing',     np.float32),
+    ('distance',    np.float32),
+    ('orientation', np.float32),
+])
+
+# Frames the worker processes detect on, set by _init_worker
+_frames = None
+
+
+def _init_worker(frames, calibration_path):
+    global _frames
+    if isinstance(frames, str):
+        frames = np.load(frames, mmap_mode='r')
+    _frames = frames
+    if calibration_path is not None:
+        vision.LoadCalibration(calibration_path)
+
+
+def _detect_chunk(bounds):
+    start, stop = bounds
+    rows = []
+    for index in range(start, stop):
+        _, detections, _ = vision.ProcessFrame(_frames[index])
+        rows += [ (index, OBJECT_CODES[d.type], d.bearing, d.distance, d.orientation) for d in detections ]
+    return np.array(rows, dtype=BATCH_RECORD)
+
+
+def DetectBatch(frames, chunk_size=64, processes=None, calibration_path=None):
+    '''
+    Runs detection on every frame of an (N, H, W, 3) array or a raw .npy
+    frame file. Returns a BATCH_RECORD array ordered by frame index.
+    '''
+    count  = len(np.load(frames, mmap_mode='r')) if isinstance(frames, str) else len(frames)
+    chunks = [ (start, min(start + chunk_size, count)) for start in range(0, count, chunk_size) ]
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=BATCH_RECORD)
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(frames, calibration_path)) as pool:
+        results = pool.map(_detect_chunk, chunks)
+    return np.concatenate(results)
+
+
+if __name__ == '__main__':
+    from .benchmark import LoadCorpus
+
+    parser = argparse.ArgumentParser(description='Run vision over a recorded frame corpus in parallel.')
+    parser.add_argument('corpus', help='Directory of images, a video file or a raw .npy frame file.')
+    parser.add_argument('--chunk', type=int, default=64, help='Frames per work item.')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count.')
+    parser.add_argument('--calibration', default=None, help='Camera calibration file to measure with.')
+    parser.add_argument('--output', help='Write the detection table to this .npy file.')
+    args = parser.parse_args()
+
+    # Raw files are memory-mapped by each worker, everything else is decoded here
+    frames = args.corpus if args.corpus.endswith('.npy') else np.stack(LoadCorpus(args.corpus))
+    table  = DetectBatch(frames, args.chunk, args.processes, args.calibration)
+
+    print('{} detections, {} frames with at least one'.format(len(table), len(np.unique(table['frame']))))
+    for code, object_type in enumerate(OBJECT_TYPES):
+        print('{:<10}{:>8}'.format(object_type.name.title(), int(np.count_nonzero(table['type'] == code))))
+
+    if args.output:
+        np.save(args.output, table)
@@ -0,0 +1,129 @@
+'''
+Replays a corpus of recorded frames through the vision pipeline and reports
+per-stage timings.
+
+  python -m subsystems.vision.benchmark <corpus> [--repeat N] [--json out.json]
+
+The corpus is a directory of images, a video file or a raw .npy frame file.
+Images and video are decoded up front and raw files are memory-mapped, so
+only the pipeline itself is timed.
+'''
+import argparse
+import json
+import os
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+from . import vision
+from .sources import OpenSource, RawFileSource
+from .timing import FrameTimer, STAGES
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def LoadCorpus(path):
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frames.append(cv2.imread(os.path.join(path, name)))
+    else:
+        cap = OpenSource(path)
+        if isinstance(cap, RawFileSource):
+            return cap.frames
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def Percentiles(samples):
+    samples = np.asarray(samples) * 1000 # ms
+    return {
+        'mean': round(float(samples.mean()), 3),
+        'p50':  round(float(np.percentile(samples, 50)), 3),
+        'p99':  round(float(np.percentile(samples, 99)), 3),
+    }
+
+
+def Run(frames, repeat=1, warmup=5):
+    timer = FrameTimer()
+    prev_timer, vision.timer = vision.timer, timer
+
+    try:
+        for frame in frames[:warmup]:
+            vision.ProcessFrame(frame)
+
+        stages     = { stage: [] for stage in STAGES }
+        totals     = []
+        detections = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for frame in frames:
+                _, detected, _ = vision.ProcessFrame(frame)
+                detections += len(detected)
+                totals.append(timer.total)
+                for stage in STAGES:
+                    stages[stage].append(timer.times[stage])
+        elapsed = time.perf_counter() - start
+    finally:
+        vision.timer = prev_timer
+
+    return {
+        'frames':      len(totals),
+        'detections':  detections,
+        'fps':         round(len(totals) / elapsed, 2) if elapsed > 0 else 0,
+        'latency_ms':  Percentiles(totals),
+        'stages_ms':   { stage: Percentiles(samples) for stage, samples in stages.items() },
+    }
+
+
+def Commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def PrintReport(report):
+    print('{} frames, {} detections, {} fps'.format(report['frames'], report['detections'], report['fps']))
+    print('{:<12}{:>10}{:>10}{:>10}'.format('stage', 'mean ms', 'p50 ms', 'p99 ms'))
+    rows = list(report['stages_ms'].items()) + [ ('total', report['latency_ms']) ]
+    for stage, t in rows:
+        print('{:<12}{:>10}{:>10}{:>10}'.format(stage, t['mean'], t['p50'], t['p99']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vision pipeline over a recorded frame corpus.')
+    parser.add_argument('corpus', help='Directory of images, a video file or a raw .npy frame file.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of passes over the corpus.')
+    parser.add_argument('--warmup', type=int, default=5, help='Frames to run before timing starts.')
+    parser.add_argument('--blobs', choices=['components', 'contours'], default=vision.BLOB_EXTRACTION, help='Blob extraction method.')
+    parser.add_argument('--json', help='Write the report to this file.')
+    args = parser.parse_args()
+
+    frames = LoadCorpus(args.corpus)
+    if len(frames) == 0:
+        print('No frames found in {}'.format(args.corpus))
+        return
+
+    vision.BLOB_EXTRACTION = args.blobs
+    report = Run(frames, args.repeat, args.warmup)
+    report['corpus'] = args.corpus
+    report['blobs']  = args.blobs
+    report['commit'] = Commit()
+    PrintReport(report)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Each field is a NumPy array with one entry per blob
+Blobs = namedtuple('Blobs', 'x y w h area cx cy')
+
+EMPTY = Blobs(*[ np.empty(0, dtype=np.int32) for _ in range(5) ],
+              np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+
+
+def FilterBlobs(blobs, min_size=0, min_extent=0, min_area=0, horizon=None):
+    '''
+    Drops blobs smaller than min_size in either dimension, blobs that fill
+    less than min_extent of their bounding box, blobs with min_area or fewer
+    pixels and, if horizon is given, blobs whose bottom edge is not below it.
+    '''
+    y, w, h, area = blobs.y, blobs.w, blobs.h, blobs.area
+    keep  = (w >= min_size) & (h >= min_size)
+    keep &= area > min_extent * w * h
+    keep &= area > min_area
+    if horizon is not None:
+        keep &= (y + h) > horizon
+    return Blobs(*[ field[keep] for field in blobs ])
+
+
+def ExtractBlobs(mask, connectivity=8):
+    '''
+    Finds the connected components of a binary mask. Returns bounding boxes,
+    pixel areas and centroids as arrays, skipping the background component.
+    '''
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=connectivity)
+    return Blobs(stats[1:, cv2.CC_STAT_LEFT],
+                 stats[1:, cv2.CC_STAT_TOP],
+                 stats[1:, cv2.CC_STAT_WIDTH],
+                 stats[1:, cv2.CC_STAT_HEIGHT],
+                 stats[1:, cv2.CC_STAT_AREA],
+                 centroids[1:, 0],
+                 centroids[1:, 1])
+
+
+def ContourBlobs(mask):
+    '''
+    Same output as ExtractBlobs but traced with findContours. Slower, kept
+    for comparison with the original detection code.
+    '''
+    # OpenCV 3 returns (image, contours, hierarchy), later versions drop the image
+    contours = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    if len(contours) == 0:
+        return EMPTY
+
+    rects = np.array([ cv2.boundingRect(c) for c in contours ], dtype=np.int32).reshape(-1, 4)
+    area  = np.array([ cv2.contourArea(c) for c in contours ], dtype=np.float64)
+    x, y, w, h = rects.T
+    return Blobs(x, y, w, h, area, x + w / 2, y + h / 2)
+
+
+def TranslateBlobs(blobs, dx, dy):
+    if dx == 0 and dy == 0:
+        return blobs
+    return Blobs(blobs.x + dx, blobs.y + dy, blobs.w, blobs.h, blobs.area, blobs.cx + dx, blobs.cy + dy)
@@ -0,0 +1,166 @@
+'''
+Camera calibration for vision geometry.
+
+Fits the camera intrinsics from chessboard frames and the pose of the camera
+above the ground plane from one frame with the board lying flat on the floor.
+From those it builds per-column bearing and per-row ground range tables for
+the processed resolution, so vision can look up geometry instead of using
+hand-tuned constants.
+
+  python -m subsystems.vision.calibration <frames> <floor frame> --square 2.5
+
+Frames are processed (resized and flipped) the same way as in vision before
+the board is located, so the tables are in processed-frame pixels.
+'''
+import argparse
+import glob
+import math
+import os
+
+import cv2
+import numpy as np
+
+DEFAULT_PATH = 'calibration.npz'
+
+# Inner corners of the calibration chessboard
+BOARD_SIZE = (9, 6)
+
+
+class Calibration:
+    def __init__(self, camera_matrix, distortion, height, pitch, resolution):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.distortion    = np.asarray(distortion, dtype=np.float64)
+        self.height        = height     # Camera height above the floor (cm)
+        self.pitch         = pitch      # Downward tilt of the optical axis (radians)
+        self.resolution    = resolution # (width, height) the intrinsics were fitted at
+        self.__tables      = {}
+
+    def save(self, path=DEFAULT_PATH):
+        np.savez(path, camera_matrix=self.camera_matrix, distortion=self.distortion,
+                 height=self.height, pitch=self.pitch, resolution=self.resolution)
+
+    @staticmethod
+    def load(path=DEFAULT_PATH):
+        data = np.load(path)
+        return Calibration(data['camera_matrix'], data['distortion'], float(data['height']),
+                           float(data['pitch']), tuple(int(v) for v in data['resolution']))
+
+    def intrinsics(self, width, height):
+        # Camera matrix rescaled to another resolution
+        K = self.camera_matrix.copy()
+        K[0] *= width  / self.resolution[0]
+        K[1] *= height / self.resolution[1]
+        return K
+
+    def tables(self, width, height):
+        '''
+        Returns (bearing, ground_range) lookup tables for a width x height
+        image. bearing[u] is the bearing of column u in degrees, positive to
+        the right. ground_range[v] is the range in cm along the floor to a
+        point imaged on row v, inf at and above the horizon.
+        '''
+        key = (width, height)
+        if key not in self.__tables:
+            K = self.intrinsics(width, height)
+
+            # Undistort one pixel per column along the centre row and one per
+            # row along the centre column
+            u = np.arange(width, dtype=np.float64) + 0.5
+            v = np.arange(height, dtype=np.float64) + 0.5
+            columns = np.stack([ u, np.full(width, K[1, 2]) ], axis=1).reshape(-1, 1, 2)
+            rows    = np.stack([ np.full(height, K[0, 2]), v ], axis=1).reshape(-1, 1, 2)
+            x = cv2.undistortPoints(columns, K, self.distortion).reshape(-1, 2)[:, 0]
+            y = cv2.undistortPoints(rows, K, self.distortion).reshape(-1, 2)[:, 1]
+
+            bearing    = np.degrees(np.arctan(x))
+            depression = np.arctan(y) + self.pitch
+            with np.errstate(divide='ignore'):
+                ground_range = np.where(depression > 0, self.height / np.tan(depression), np.inf)
+
+            self.__tables[key] = (bearing.astype(np.float32), ground_range.astype(np.float32))
+        return self.__tables[key]
+
+
+def FindBoard(frame, board_size=BOARD_SIZE):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    found, corners = cv2.findChessboardCorners(gray, board_size)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    return cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+
+
+def BoardPoints(square, board_size=BOARD_SIZE):
+    points = np.zeros((board_size[0] * board_size[1], 3), np.float32)
+    points[:, :2] = np.mgrid[0:board_size[0], 0:board_size[1]].T.reshape(-1, 2) * square
+    return points
+
+
+def FitIntrinsics(frames, square, board_size=BOARD_SIZE):
+    object_points = []
+    image_points  = []
+    for frame in frames:
+        corners = FindBoard(frame, board_size)
+        if corners is not None:
+            object_points.append(BoardPoints(square, board_size))
+            image_points.append(corners)
+
+    if len(image_points) < 3:
+        raise RuntimeError('Calibration needs at least 3 frames with the board visible, found {}'.format(len(image_points)))
+
+    height, width = frames[0].shape[:2]
+    error, K, dist, _, _ = cv2.calibrateCamera(object_points, image_points, (width, height), None, None)
+    return K, dist, error
+
+
+def FitGroundPose(frame, camera_matrix, distortion, square, board_size=BOARD_SIZE):
+    # With the board flat on the floor its plane is the ground plane. The
+    # camera height is the distance from the camera to that plane and the
+    # pitch is the angle of the optical axis below it.
+    corners = FindBoard(frame, board_size)
+    if corners is None:
+        raise RuntimeError('Board not found in the floor frame')
+
+    ok, rvec, tvec = cv2.solvePnP(BoardPoints(square, board_size), corners, camera_matrix, distortion)
+    if not ok:
+        raise RuntimeError('Could not fit the camera pose to the board in the floor frame')
+    R, _   = cv2.Rodrigues(rvec)
+    t      = tvec.ravel()
+    normal = R[:, 2] # Board z axis in camera coordinates
+    if normal.dot(t) > 0:
+        normal = -normal # Point it from the floor towards the camera
+
+    # The camera's forward axis is 90 degrees plus the pitch away from up
+    height = float(-normal.dot(t))
+    pitch  = math.asin(max(-1.0, min(1.0, float(-normal[2]))))
+    return height, pitch
+
+
+def Calibrate(frames, floor_frame, square, board_size=BOARD_SIZE):
+    K, dist, error = FitIntrinsics(frames, square, board_size)
+    height, pitch  = FitGroundPose(floor_frame, K, dist, square, board_size)
+    resolution     = (frames[0].shape[1], frames[0].shape[0])
+    return Calibration(K, dist, height, pitch, resolution), error
+
+
+if __name__ == '__main__':
+    from . import vision
+
+    parser = argparse.ArgumentParser(description='Fit camera intrinsics and ground plane pose for vision.')
+    parser.add_argument('frames', help='Glob of chessboard frames, e.g. "calib/*.png".')
+    parser.add_argument('floor', help='Frame with the chessboard flat on the floor.')
+    parser.add_argument('--square', type=float, default=2.5, help='Chessboard square size in cm.')
+    parser.add_argument('--output', default=DEFAULT_PATH, help='Calibration file to write.')
+    args = parser.parse_args()
+
+    def load(path):
+        frame = cv2.imread(path)
+        frame = cv2.resize(frame, (int(frame.shape[1] * vision.SCALE), int(frame.shape[0] * vision.SCALE)))
+        return cv2.flip(frame, vision.FLIP) if vision.FLIP is not None else frame
+
+    frames = [ load(p) for p in sorted(glob.glob(args.frames)) ]
+    calibration, error = Calibrate(frames, load(args.floor), args.square)
+    calibration.save(args.output)
+    print('Reprojection error: {:.3f}px, camera height: {:.1f}cm, pitch: {:.1f}deg'.format(
+        error, calibration.height, math.degrees(calibration.pitch)))
+    print('Saved {}'.format(os.path.abspath(args.output)))
@@ -0,0 +1,138 @@
+import threading
+import time
+
+
+class FrameGrabber:
+    '''
+    Owns a capture object and reads from it on a background thread.
+
+    Frames are written into a small ring of preallocated buffers so read()
+    always hands back the newest frame without waiting on the camera. A live
+    camera that fails a read is retried. Any other source has reached its
+    end, and read() returns False once its last frame has been handed out.
+    '''
+
+    def __init__(self, cap, num_buffers=3, live=True):
+        # Need at least one slot being written, one holding the newest frame
+        # and one held by the reader.
+        self.cap          = cap
+        self.live         = live
+        self.eof          = False
+        self.num_buffers  = max(3, num_buffers)
+        self.frames       = None
+        self.captured     = 0 # Frames read from the camera
+        self.delivered    = 0 # Frames handed to the reader
+        self.dropped      = 0 # Frames overwritten before being read
+        self.duplicates   = 0 # Reads that returned an already delivered frame
+        self.__latest     = -1
+        self.__latest_seq = 0
+        self.__read_slot  = -1
+        self.__read_seq   = 0
+        self.__lock       = threading.Lock()
+        self.__new_frame  = threading.Condition(self.__lock)
+        self.__running    = False
+        self.__thread     = None
+        self.__start_time = 0
+
+    def start(self):
+        if self.__running:
+            return self
+        self.__running    = True
+        self.__start_time = time.time()
+        self.__thread     = threading.Thread(target=self.__run, name='FrameGrabber', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def release(self):
+        self.stop()
+        self.cap.release()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def __next_slot(self):
+        with self.__lock:
+            for i in range(self.num_buffers):
+                if i != self.__latest and i != self.__read_slot:
+                    return i
+        return -1
+
+    def __run(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            self.__end()
+            return
+
+        # Preallocate the ring using the first frame as a template
+        self.frames = [ frame.copy() for _ in range(self.num_buffers) ]
+        self.__publish(0)
+
+        while self.__running:
+            slot = self.__next_slot()
+            ret, _ = self.cap.read(self.frames[slot])
+            if not ret:
+                if not self.live:
+                    self.__end()
+                    return
+                time.sleep(0.005)
+                continue
+            self.__publish(slot)
+
+    def __end(self):
+        with self.__lock:
+            self.eof       = True
+            self.__running = False
+            self.__new_frame.notify_all()
+
+    def __publish(self, slot):
+        with self.__lock:
+            if self.__latest_seq > self.__read_seq:
+                self.dropped += 1
+            self.captured     += 1
+            self.__latest      = slot
+            self.__latest_seq  = self.captured
+            self.__new_frame.notify_all()
+
+    def read(self, timeout=0):
+        '''
+        Returns (ret, frame) for the newest captured frame. Never blocks on the
+        camera unless a timeout is given, in which case it waits up to that
+        long for a frame it has not returned before. The frame stays valid
+        until the next call to read().
+        '''
+        with self.__lock:
+            if timeout > 0 and self.__latest_seq == self.__read_seq and not self.eof:
+                self.__new_frame.wait(timeout)
+            if self.__latest < 0:
+                return False, None
+            if self.eof and self.__latest_seq == self.__read_seq:
+                return False, None
+            if self.__latest_seq == self.__read_seq:
+                self.duplicates += 1
+            else:
+                self.delivered += 1
+            self.__read_slot = self.__latest
+            self.__read_seq  = self.__latest_seq
+            return True, self.frames[self.__read_slot]
+
+    def capture_rate(self):
+        elapsed = time.time() - self.__start_time
+        return self.captured / elapsed if elapsed > 0 else 0
+
+    def stats(self):
+        return {
+            'captured':     self.captured,
+            'delivered':    self.delivered,
+            'dropped':      self.dropped,
+            'duplicates':   self.duplicates,
+            'capture_rate': round(self.capture_rate(), 1)
+        }
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+
+# OpenCV stores 8-bit hue in [0, 180)
+HUE_RANGE = 180
+
+# One bit per HSV range in the per-channel tables
+MAX_RANGES = 8
+
+
+class ColourClassifier:
+    '''
+    Labels every pixel of an HSV image with a few table lookups.
+
+    Each HSV range gets one bit. A 256-entry table per channel holds the bits
+    of the ranges whose interval on that channel contains the value, so ANDing
+    the three lookups leaves the bits of the ranges a pixel falls in, exactly
+    as cv2.inRange would. A last 256-entry table maps those bits to the label
+    of the first class listed among them. Label 0 is reserved for
+    unclassified pixels.
+    '''
+
+    def __init__(self, classes):
+        # classes: list of (label, [(hsv_min, hsv_max), ...]). When ranges
+        # overlap the class listed first wins.
+        self.labels = [ label for label, _ in classes ]
+        ranges      = [ (label, lo, hi) for label, class_ranges in classes for lo, hi in class_ranges ]
+        if len(ranges) > MAX_RANGES:
+            raise ValueError('At most {} HSV ranges, got {}'.format(MAX_RANGES, len(ranges)))
+
+        values        = np.arange(256)
+        self.channel  = np.zeros((3, 256), dtype=np.uint8)
+        self.priority = np.zeros(256, dtype=np.uint8)
+        for bit, (label, lo, hi) in enumerate(ranges):
+            for c in range(3):
+                self.channel[c, (values >= lo[c]) & (values <= hi[c])] |= 1 << bit
+
+        # Fill from the last class so the first listed overwrites the rest
+        for bit, (label, _, _) in reversed(list(enumerate(ranges))):
+            self.priority[(values & (1 << bit)) != 0] = label
+        self.__bits = None
+
+    def __buffer(self, shape):
+        # Grow-only like vision.Buffer(), so class ROIs and tracking windows
+        # of every size reuse the largest seen so far
+        size = int(np.prod(shape))
+        if self.__bits is None or self.__bits.size < size:
+            self.__bits = np.empty(size, dtype=np.uint8)
+        return self.__bits[:size].reshape(shape)
+
+    def classify(self, hsv, out=None):
+        '''
+        Returns a uint8 label image with the same height and width as hsv.
+        '''
+        planes = self.__buffer((3,) + hsv.shape[:2])
+        cv2.split(hsv, list(planes))
+        for c in range(3):
+            cv2.LUT(planes[c], self.channel[c], dst=planes[c])
+
+        if out is None:
+            out = np.empty(hsv.shape[:2], dtype=np.uint8)
+        cv2.bitwise_and(planes[0], planes[1], dst=out)
+        cv2.bitwise_and(out, planes[2], dst=out)
+        return cv2.LUT(out, self.priority, dst=out)
+
+    def masks(self, labels, classes=None, out=None):
+        '''
+        Splits a label image into a 0/255 mask for each label in classes, all
+        of them by default.
+
+        Returns a dict of label -> mask. Each mask is written into a slice of
+        out, a (len(classes), H, W) array, when it is given.
+        '''
+        if classes is None:
+            classes = self.labels
+        shape = (len(classes),) + labels.shape
+        if out is None or out.shape != shape:
+            out = np.empty(shape, dtype=np.uint8)
+        return { label: cv2.compare(labels, label, cv2.CMP_EQ, dst=out[i]) for i, label in enumerate(classes) }
@@ -0,0 +1,78 @@
+import multiprocessing
+import queue
+import time
+
+import cv2
+
+TEXT_COLOUR = (150, 255, 0)
+
+
+def DrawDetections(frame, detections, freq, origin=(0, 0)):
+    # Detections are in full frame coordinates, frame may be cropped to an ROI
+    img = frame.copy()
+    for d in detections:
+        x, y, w, h = d.x - origin[0], d.y - origin[1], d.w, d.h
+        cv2.rectangle(img, (x, y), (x+w, y+h), TEXT_COLOUR, 2)
+
+        Oriantation = 'Straight' if d.orientation > 85 else str(d.orientation)
+        cv2.putText(img, ('Bearing: ' + str(d.bearing)), (x+w+10, y-30), 0, 0.3, TEXT_COLOUR)
+        cv2.putText(img, ('Distance: ' + str(d.distance)), (x+w+10, y-20), 0, 0.3, TEXT_COLOUR)
+        cv2.putText(img, ('Oriantation: ' + Oriantation), (x+w+10, y-10), 0, 0.3, TEXT_COLOUR)
+        cv2.putText(img, (d.type.name.title() + ', Height:' + str(h)), (x+w+10, y+h), 0, 0.3, TEXT_COLOUR)
+
+    cv2.putText(img, ('Frequency: ' + str(freq) + 'Hz'), (30, 30), 0, 0.3, TEXT_COLOUR)
+    return img
+
+
+def _render(frames):
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        cv2.imshow('Frame_Detections', DrawDetections(*item))
+        cv2.waitKey(1)
+    cv2.destroyAllWindows()
+
+
+class DebugSink:
+    '''
+    Renders the detection overlay in a separate process.
+
+    submit() is throttled to max_rate and never blocks the caller. If the
+    renderer is still busy with the previous frame the new one is dropped.
+    '''
+
+    def __init__(self, max_rate=5):
+        self.period      = 1 / max_rate
+        self.last_submit = 0
+        self.frames      = multiprocessing.Queue(maxsize=1)
+        self.process     = multiprocessing.Process(target=_render, args=(self.frames,), name='VisionDebug', daemon=True)
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def stop(self):
+        try:
+            self.frames.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self.process.join(timeout=1)
+
+    def ready(self):
+        # Whether submit() would take a frame now, so callers can skip
+        # preparing one that would be dropped
+        return time.time() - self.last_submit >= self.period
+
+    def submit(self, frame, detections, freq, origin=(0, 0)):
+        now = time.time()
+        if now - self.last_submit < self.period:
+            return False
+        self.last_submit = now
+        try:
+            # The queue pickles on a feeder thread and vision reuses its
+            # frame buffers, so hand over a copy
+            self.frames.put_nowait((frame.copy(), detections, freq, origin))
+            return True
+        except queue.Full:
+            return False
@@ -0,0 +1,280 @@
+import functools
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from ..interop import DETECTION, NO_TRACK, OBJECT_CODES
+from . import vision
+from .capture import FrameGrabber
+from .timing import StageHistograms
+
+# Results header: sequence lock, record count, capture time and frames processed
+HEADER = np.dtype([
+    ('seq',       np.int64),
+    ('count',     np.int64),
+    ('timestamp', np.float64),
+    ('frames',    np.int64),
+])
+
+# Seconds between the latency reports each stage sends when timed
+TELEMETRY_INTERVAL = 1.0
+
+
+def _start_telemetry(enabled):
+    # Times the stage with histograms, returns the next report time
+    if not enabled:
+        return None
+    vision.timer = StageHistograms()
+    return time.time() + TELEMETRY_INTERVAL
+
+
+def _send_telemetry(name, reports, due):
+    # Sends the stage's report if one is due, returns the next report time
+    if due is None or time.time() < due:
+        return due
+    try:
+        reports.put_nowait((name, vision.timer.report()))
+    except queue.Full:
+        pass # The reader is behind, it gets the next one
+    return time.time() + TELEMETRY_INTERVAL
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _convert_stage(source, slots_name, slots_shape, free, ready, running, schedule, calibration_path, params_path, resolution,
+                   reports, telemetry):
+    # Stage 1: capture, resize, flip, brightness, cvtColor and classification.
+    # Writes label images straight into shared memory slots. Loads the
+    # calibration too so its crop matches the detect stage's class ROIs. Owns
+    # the detection schedule and tells the detect stage which classes are due.
+    if calibration_path is not None and vision.LoadCalibration(calibration_path) is not None:
+        vision.UseGroundRois(*resolution)
+    if params_path is not None:
+        vision.LoadParams(params_path)
+    shm, slots = _attach(slots_name, slots_shape, np.uint8)
+    cap     = source()
+    resized = None
+    due     = _start_telemetry(telemetry)
+    try:
+        while running.value:
+            # Wait for a fresh frame rather than reprocessing the last one
+            if isinstance(cap, FrameGrabber):
+                ret, frame = cap.read(timeout=0.1)
+            else:
+                ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.005)
+                continue
+            timestamp = time.time()
+
+            # The slots are sized for the configured resolution. A camera that
+            # ignored it would overflow them, so bring its frames to that size.
+            if frame.shape[1::-1] != tuple(resolution):
+                if resized is None:
+                    print('Camera resolution {} is not the configured {}, resizing frames'.format(frame.shape[1::-1], tuple(resolution)))
+                    resized = np.empty((resolution[1], resolution[0], 3), dtype=np.uint8)
+                frame = cv2.resize(frame, tuple(resolution), dst=resized)
+
+            try:
+                while True:
+                    vision.SetSchedule(schedule.get_nowait())
+            except queue.Empty:
+                pass
+
+            try:
+                slot = free.get(timeout=0.1)
+            except queue.Empty:
+                continue # Detect stage is behind, drop this frame
+
+            classes = vision.NextClasses()
+            if len(classes) == 0:
+                free.put(slot)
+                continue
+
+            vision.timer.start()
+            roi = vision.UnionRoi(classes)
+            _, hsv, origin, capsize = vision.Preprocess(frame, roi)
+            rows, cols = hsv.shape[:2]
+            vision.CLASSIFIER.classify(hsv, out=slots[slot, :rows, :cols])
+            vision.timer.lap('threshold')
+            ready.put((slot, rows, cols, roi, origin, capsize, timestamp, [ c.type for c in classes ]))
+            vision.timer.finish()
+            due = _send_telemetry('convert', reports, due)
+    finally:
+        ready.put(None)
+        cap.release()
+        del slots
+        shm.close()
+
+
+def _detect_stage(slots_name, slots_shape, results_name, max_records, free, ready, calibration_path, params_path, resolution,
+                  reports, telemetry):
+    # Stage 2: blob extraction and geometry. Publishes compact records under a
+    # sequence lock so the reader never waits on this process.
+    if calibration_path is not None and vision.LoadCalibration(calibration_path) is not None:
+        vision.UseGroundRois(*resolution)
+    if params_path is not None:
+        vision.LoadParams(params_path)
+    shm, slots = _attach(slots_name, slots_shape, np.uint8)
+    res_shm = shared_memory.SharedMemory(name=results_name)
+    header  = np.ndarray((), dtype=HEADER, buffer=res_shm.buf)
+    records = np.ndarray((max_records,), dtype=DETECTION, buffer=res_shm.buf, offset=HEADER.itemsize)
+    due     = _start_telemetry(telemetry)
+    try:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            slot, rows, cols, roi, origin, capsize, timestamp, types = item
+            vision.timer.start()
+            classes    = [ c for c in vision.DETECTION_CLASSES if c.type in types ]
+            detections = vision.DetectLabels(slots[slot, :rows, :cols], roi, origin, capsize, classes)
+            free.put(slot)
+            vision.timer.finish()
+            due = _send_telemetry('detect', reports, due)
+
+            count = min(len(detections), max_records)
+            header['seq'] += 1 # Odd while writing
+            for i, d in enumerate(detections[:count]):
+                records[i] = (OBJECT_CODES[d.type], d.bearing, d.distance, d.orientation, timestamp, NO_TRACK)
+            header['count']     = count
+            header['timestamp'] = timestamp
+            header['frames']   += 1
+            header['seq']      += 1
+    finally:
+        del slots, header, records
+        shm.close()
+        res_shm.close()
+
+
+class VisionPipeline:
+    '''
+    Runs vision in two worker processes connected by shared memory.
+
+    The convert stage owns the camera and writes label images into a ring of
+    shared slots. The detect stage turns them into detection records. Only
+    slot indices and small frame descriptions cross the queues, never pixels.
+    With telemetry each stage keeps its own latency histograms and sends a
+    report every TELEMETRY_INTERVAL, see telemetry().
+    '''
+
+    def __init__(self, source=None, resolution=(640, 480), num_slots=3, max_records=64, calibration_path=None, params_path=None,
+                 telemetry=False):
+        width, height     = resolution
+        self.source       = source if source is not None else functools.partial(vision.Initialize, resolution=resolution)
+        self.resolution   = resolution
+        self.calibration  = calibration_path
+        self.params       = params_path
+        self.max_records  = max_records
+        self.slots_shape  = (num_slots, int(height * vision.SCALE), int(width * vision.SCALE))
+        self.slots_shm    = shared_memory.SharedMemory(create=True, size=int(np.prod(self.slots_shape)))
+        self.results_shm  = shared_memory.SharedMemory(create=True, size=HEADER.itemsize + DETECTION.itemsize * max_records)
+        self.header       = np.ndarray((), dtype=HEADER, buffer=self.results_shm.buf)
+        self.records      = np.ndarray((max_records,), dtype=DETECTION, buffer=self.results_shm.buf, offset=HEADER.itemsize)
+        self.header.fill(0)
+        self.last_seq     = 0
+        self.last_frames  = 0 # Frames processed, kept once stopped
+        self.free         = multiprocessing.Queue()
+        self.ready        = multiprocessing.Queue()
+        self.running      = multiprocessing.Value('b', True)
+        self.schedule     = multiprocessing.Queue()
+        self.telemetry_on = telemetry
+        self.reports      = multiprocessing.Queue(maxsize=8)
+        self.last_reports = {} # Stage name -> its latest report
+        self.processes    = []
+        for slot in range(num_slots):
+            self.free.put(slot)
+
+    def start(self):
+        self.processes = [
+            multiprocessing.Process(target=_convert_stage, name='VisionConvert', daemon=True,
+                args=(self.source, self.slots_shm.name, self.slots_shape, self.free, self.ready, self.running, self.schedule,
+                      self.calibration, self.params, self.resolution, self.reports, self.telemetry_on)),
+            multiprocessing.Process(target=_detect_stage, name='VisionDetect', daemon=True,
+                args=(self.slots_shm.name, self.slots_shape, self.results_shm.name, self.max_records, self.free, self.ready,
+                      self.calibration, self.params, self.resolution, self.reports, self.telemetry_on)),
+        ]
+        for p in self.processes:
+            p.start()
+        return self
+
+    def stop(self):
+        if self.header is None:
+            return
+        self.running.value = False
+        for p in self.processes:
+            p.join(timeout=2)
+        self.processes   = []
+        self.last_frames = self.frames()
+        self.header      = None # Reads after this find nothing new
+        self.records     = None
+        for shm in (self.slots_shm, self.results_shm):
+            shm.close()
+            shm.unlink()
+
+    def set_schedule(self, intervals):
+        # Frames between detections of each ObjectType, see vision.SetSchedule
+        self.schedule.put(dict(intervals))
+
+    def frames(self):
+        if self.header is None:
+            return self.last_frames
+        return int(self.header['frames'])
+
+    def read(self):
+        '''
+        Returns (records, timestamp) for the newest complete result, or
+        (None, 0) if nothing new has been published or the pipeline has been
+        stopped. Never blocks.
+        '''
+        if self.header is None:
+            return None, 0
+        for _ in range(3):
+            seq = int(self.header['seq'])
+            if seq % 2 == 1:
+                continue # Writer is mid-update
+            if seq == self.last_seq:
+                return None, 0
+            count     = int(self.header['count'])
+            records   = self.records[:count].copy()
+            timestamp = float(self.header['timestamp'])
+            if int(self.header['seq']) == seq:
+                self.last_seq = seq
+                return records, timestamp
+        return None, 0
+
+    def latest(self):
+        # Newest DETECTION batch, None if nothing new has been published. An
+        # empty batch means a frame was processed and nothing was seen.
+        records, _ = self.read()
+        if self.telemetry_on and records is not None:
+            self.collect_reports()
+        return records
+
+    def collect_reports(self):
+        # Keep the newest report from each stage, so the queue never fills
+        # with stale ones
+        try:
+            while True:
+                name, report = self.reports.get_nowait()
+                self.last_reports[name] = report
+        except queue.Empty:
+            pass
+
+    def telemetry(self):
+        # Latency reports of both stages, None unless started with telemetry
+        # or before the stages have sent one
+        if not self.telemetry_on:
+            return None
+        self.collect_reports()
+        if len(self.last_reports) == 0:
+            return None
+        return '\n'.join('{} stage, {}'.format(name.title(), self.last_reports[name])
+                         for name in ('convert', 'detect') if name in self.last_reports)
@@ -0,0 +1,63 @@
+from ..interop import ObjectType
+from . import vision
+
+# Objects close enough that they fill plenty of pixels at the lowest scale
+NEAR_TYPES    = (ObjectType.SAMPLE, ObjectType.LANDER)
+NEAR_DISTANCE = 60
+
+
+class AdaptiveResolution:
+    '''
+    Picks the processing scale for the next frame. Frame time is smoothed
+    and compared against the budget for the target rate: over budget steps
+    down a preset, and enough headroom for the next preset up steps back up.
+    With a sample or the lander close by, small objects don't matter and the
+    lowest preset is used regardless.
+    '''
+
+    def __init__(self, target_fps, scales=vision.SCALES, smoothing=0.2, hold=10):
+        self.budget     = 1 / target_fps
+        self.scales     = sorted(scales)
+        self.smoothing  = smoothing # Weight of the newest frame time
+        self.hold       = hold      # Frames to wait after a change before the next
+        self.index      = self.__nearest(vision.SCALE)
+        self.frame_time = None
+        self.__since    = 0
+
+    def __nearest(self, scale):
+        return min(range(len(self.scales)), key=lambda i: abs(self.scales[i] - scale))
+
+    def update(self, frame_time, detections):
+        # The time measured belongs to the current scale
+        if self.frame_time is None:
+            self.frame_time = frame_time
+        else:
+            self.frame_time += self.smoothing * (frame_time - self.frame_time)
+        self.__since += 1
+
+        if any(d.type in NEAR_TYPES and d.distance < NEAR_DISTANCE for d in detections):
+            return self.__select(0)
+
+        if self.__since < self.hold:
+            return self.scales[self.index]
+
+        if self.frame_time > self.budget and self.index > 0:
+            return self.__select(self.index - 1)
+
+        if self.index < len(self.scales) - 1:
+            # Cost grows with the pixel count, so predict the next preset up
+            # from the area ratio and leave some margin
+            ratio = (self.scales[self.index + 1] / self.scales[self.index]) ** 2
+            if self.frame_time * ratio < 0.9 * self.budget:
+                return self.__select(self.index + 1)
+
+        return self.scales[self.index]
+
+    def __select(self, index):
+        if index != self.index:
+            # Rescale the estimate so the next comparison is against the new preset
+            ratio           = (self.scales[index] / self.scales[self.index]) ** 2
+            self.frame_time = self.frame_time * ratio
+            self.index      = index
+            self.__since    = 0
+        return self.scales[self.index]
@@ -0,0 +1,209 @@
+'''
+Frame sources for vision. Every source reads like a cv2.VideoCapture, so the
+same detection code can run on the live camera, a recorded video or a raw
+frame file.
+
+Raw frame files are .npy arrays of shape (N, H, W, 3), memory-mapped so each
+frame is a zero-copy view. Record one from the camera with
+
+  python -m subsystems.vision.sources <out.npy> --frames N
+'''
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    # Conversion to HSV for the frames this source produces
+    hsv_conversion = cv2.COLOR_BGR2HSV
+
+    def read(self, image=None):
+        raise NotImplementedError()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class CaptureSource(FrameSource):
+    def __init__(self, target):
+        self.cap = cv2.VideoCapture(target)
+
+    @property
+    def width(self):
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+    @property
+    def height(self):
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def read(self, image=None):
+        return self.cap.read(image)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class CameraSource(CaptureSource):
+    def __init__(self, index=0):
+        super().__init__(index)
+
+
+class VideoFileSource(CaptureSource):
+    def __init__(self, path, loop=False):
+        super().__init__(path)
+        self.loop = loop
+
+    def read(self, image=None):
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+
+class RawFileSource(FrameSource):
+    def __init__(self, path, loop=False):
+        self.frames = np.load(path, mmap_mode='r')
+        self.loop   = loop
+        self.index  = 0
+
+    @property
+    def width(self):
+        return self.frames.shape[2]
+
+    @property
+    def height(self):
+        return self.frames.shape[1]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def read(self, image=None):
+        if self.index >= len(self.frames):
+            if not self.loop or len(self.frames) == 0:
+                return False, None
+            self.index = 0
+
+        frame = self.frames[self.index]
+        self.index += 1
+        if image is not None:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.frames)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.index
+        return super().get(prop)
+
+    def isOpened(self):
+        return len(self.frames) > 0
+
+    def release(self):
+        self.frames = self.frames[:0]
+
+
+class SimCameraSource(FrameSource):
+    # V-REP vision sensors stream RGB
+    hsv_conversion = cv2.COLOR_RGB2HSV
+
+    def __init__(self, sim, timeout=2):
+        # The first streamed image takes a few round trips to arrive. Wait
+        # for it so the size is known, it stays 0 x 0 if none comes in time.
+        self.sim    = sim
+        self.width  = 0
+        self.height = 0
+        deadline = time.time() + timeout
+        while not self.read()[0] and self.isOpened() and time.time() < deadline:
+            time.sleep(0.02)
+
+    def read(self, image=None):
+        # Frames view the remote API's buffer and are stored bottom-up, which
+        # the vertical FLIP vision applies for the real camera already undoes
+        resolution, frame = self.sim.GetCameraImage()
+        if frame is None:
+            return False, None
+        self.width, self.height = resolution
+        if image is not None:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def isOpened(self):
+        return self.sim.cameraHandle is not None
+
+
+def OpenSource(source=0, loop=False):
+    '''
+    Opens a camera index, a raw .npy frame file or any video OpenCV can decode.
+    '''
+    if isinstance(source, FrameSource):
+        return source
+    if isinstance(source, int):
+        return CameraSource(source)
+    if str(source).endswith('.npy'):
+        return RawFileSource(source, loop)
+    return VideoFileSource(source, loop)
+
+
+def RecordRawFile(path, source, count):
+    # Reads up to count frames from source into a memory-mapped .npy file
+    ret, frame = source.read()
+    if not ret:
+        return 0
+
+    frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(count,) + frame.shape)
+    frames[0] = frame
+    recorded = 1
+    while recorded < count:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames[recorded] = frame
+        recorded += 1
+    frames.flush()
+
+    if recorded < count:
+        # Trim the unused tail so the file only holds real frames
+        kept = np.array(frames[:recorded])
+        del frames
+        np.save(path, kept)
+    return recorded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record camera frames into a raw .npy frame file.')
+    parser.add_argument('output', help='Path of the .npy file to write.')
+    parser.add_argument('--frames', type=int, default=300, help='Number of frames to record.')
+    parser.add_argument('--source', default='0', help='Camera index or video file to record from.')
+    args = parser.parse_args()
+
+    source = OpenSource(int(args.source) if args.source.isdigit() else args.source)
+    print('Recorded {} frames'.format(RecordRawFile(args.output, source, args.frames)))
+    source.release()
@@ -0,0 +1,129 @@
+import bisect
+import math
+import time
+
+# Pipeline stages in the order a frame passes through them
+STAGES = ('resize', 'flip', 'brightness', 'cvtColor', 'threshold', 'blobs', 'geometry')
+
+
+class NullTimer:
+    '''
+    Stage timer interface. Does nothing, used when vision is not being timed.
+    '''
+
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def finish(self):
+        pass
+
+
+class FrameTimer(NullTimer):
+    '''
+    Accumulates the time spent in each stage of one frame. Stages that run
+    more than once per frame (one blob pass per class) are summed.
+    '''
+
+    def __init__(self):
+        self.times  = { stage: 0.0 for stage in STAGES }
+        self.total  = 0.0
+        self.__t0   = 0.0
+        self.__last = 0.0
+
+    def start(self):
+        for stage in self.times:
+            self.times[stage] = 0.0
+        self.__t0   = time.perf_counter()
+        self.__last = self.__t0
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.times[stage] += now - self.__last
+        self.__last = now
+
+    def finish(self):
+        self.total = time.perf_counter() - self.__t0
+
+
+# Upper edges of the latency histogram buckets in milliseconds. Anything
+# slower than the last edge is counted in an overflow bucket.
+BUCKETS_MS = (0.1, 0.2, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+class StageHistograms(NullTimer):
+    '''
+    Counts the time spent in each stage, and in each whole frame, into fixed
+    latency buckets. All storage is allocated up front so it can stay on in
+    the rover's main loop. Stages that did not run in a frame are not counted.
+    '''
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.names   = STAGES + ('total',)
+        self.counts  = { name: [ 0 ] * (len(buckets) + 1) for name in self.names }
+        self.sums    = { name: 0.0 for name in self.names }
+        self.frames  = 0
+        self.first   = None
+        self.last    = 0.0
+        self.__edges = tuple(b / 1000 for b in buckets)
+        self.__times = { stage: 0.0 for stage in STAGES }
+        self.__t0    = 0.0
+        self.__prev  = 0.0
+
+    def start(self):
+        for stage in STAGES:
+            self.__times[stage] = 0.0
+        self.__t0   = time.perf_counter()
+        self.__prev = self.__t0
+        if self.first is None:
+            self.first = self.__t0
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.__times[stage] += now - self.__prev
+        self.__prev = now
+
+    def finish(self):
+        now = time.perf_counter()
+        for stage in STAGES:
+            if self.__times[stage] > 0:
+                self.__count(stage, self.__times[stage])
+        self.__count('total', now - self.__t0)
+        self.frames += 1
+        self.last    = now
+
+    def __count(self, name, seconds):
+        self.counts[name][bisect.bisect_left(self.__edges, seconds)] += 1
+        self.sums[name] += seconds
+
+    def percentile(self, name, q):
+        # Upper edge in ms of the bucket holding the q-th percentile, inf if
+        # it is in the overflow bucket
+        counts = self.counts[name]
+        target = q / 100 * sum(counts)
+        seen   = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if count > 0 and seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else math.inf
+        return 0
+
+    def fps(self):
+        if self.first is None or self.last <= self.first:
+            return 0
+        return self.frames / (self.last - self.first)
+
+    def report(self):
+        lines = [ '{} frames, {:.1f} fps'.format(self.frames, self.fps()),
+                  '{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('stage', 'count', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms') ]
+        for name in self.names:
+            count = sum(self.counts[name])
+            if count == 0:
+                continue
+            lines.append('{:<12}{:>8}{:>10.2f}{:>10}{:>10}{:>10}'.format(
+                name, count, self.sums[name] * 1000 / count,
+                self.percentile(name, 50), self.percentile(name, 90), self.percentile(name, 99)))
+        return '\n'.join(lines)
@@ -0,0 +1,169 @@
+import itertools
+
+import cv2
+import numpy as np
+
+from ..interop import DetectedObject, ObjectType
+from . import vision
+from .blobs import Blobs
+
+
+def IoU(a, b):
+    x0 = max(a.x, b.x)
+    y0 = max(a.y, b.y)
+    x1 = min(a.x + a.w, b.x + b.w)
+    y1 = min(a.y + a.h, b.y + b.h)
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a.w * a.h + b.w * b.h - inter
+    return inter / union if union > 0 else 0
+
+
+def MergeWindows(boxes):
+    '''
+    Merges overlapping (x0, y0, x1, y1) boxes into their bounding boxes until
+    none overlap. Returns (box, indices of the boxes it covers) pairs.
+    '''
+    merged = [ (box, [ i ]) for i, box in enumerate(boxes) ]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i][0], merged[j][0]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    box = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    merged[i] = (box, merged[i][1] + merged[j][1])
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+class Track:
+    def __init__(self, id, detection):
+        self.id        = id
+        self.detection = detection
+        self.object    = DetectedObject(detection.type, detection.bearing, detection.distance, detection.orientation)
+
+    def update(self, detection):
+        # Keep the same DetectedObject so its identity is stable across frames
+        self.detection       = detection
+        self.object.heading  = detection.bearing
+        self.object.distance = detection.distance
+        self.object.angle    = detection.orientation
+
+
+class Tracker:
+    '''
+    Runs a full detection every `interval` frames and follows each detected
+    blob in a small search window in between. Overlapping windows are
+    converted once, as one window. Walls span the frame, so they are only
+    detected on full frames and keep their last detection in between. Any
+    lost track, or windows covering more than max_area of the frame,
+    triggers a full detection straight away.
+    '''
+
+    def __init__(self, interval=5, margin=0.5, min_iou=0.2, max_area=0.5):
+        self.interval      = interval
+        self.margin        = margin   # Search window padding as a fraction of the blob size
+        self.min_iou       = min_iou  # Overlap needed to carry a track through a full detection
+        self.max_area      = max_area # Largest fraction of the frame worth tracking in windows
+        self.tracks        = []
+        self.since_detect  = 0
+        self.full_frames   = 0
+        self.track_frames  = 0
+        self.colour_pixels = 0 # Pixels colour converted for the current frame
+        self.__ids         = itertools.count()
+        self.__classes     = { c.type: c for c in vision.DETECTION_CLASSES }
+
+    def update(self, frame):
+        self.colour_pixels = 0
+        if self.since_detect >= self.interval or len(self.tracks) == 0 or not self.track(frame):
+            self.detect(frame)
+        vision.CountFrame(frame.shape, self.colour_pixels)
+        return [ t.object for t in self.tracks ]
+
+    def detections(self):
+        return [ t.detection for t in self.tracks ]
+
+    def detect(self, frame):
+        roi = vision.UnionRoi(vision.DETECTION_CLASSES)
+        _, hsv, origin, capsize = vision.Preprocess(frame, roi)
+        self.colour_pixels += hsv.shape[0] * hsv.shape[1]
+        detections = vision.Detect(hsv, roi, origin, capsize)
+
+        # Carry identities over to the detections that overlap existing tracks
+        unmatched = list(self.tracks)
+        tracks    = []
+        for d in detections:
+            best, best_iou = None, self.min_iou
+            for t in unmatched:
+                if t.detection.type != d.type:
+                    continue
+                iou = IoU(t.detection, d)
+                if iou > best_iou:
+                    best, best_iou = t, iou
+            if best is not None:
+                unmatched.remove(best)
+                best.update(d)
+                tracks.append(best)
+            else:
+                tracks.append(Track(next(self.__ids), d))
+
+        self.tracks       = tracks
+        self.since_detect = 0
+        self.full_frames += 1
+        return detections
+
+    def window(self, detection, rows, cols):
+        # Search window around a detection as a processed-frame (x0, y0, x1, y1) box
+        pad = max(detection.w, detection.h) * self.margin
+        return (int(max(detection.x - pad, 0)), int(max(detection.y - pad, 0)),
+                int(min(detection.x + detection.w + pad, cols)), int(min(detection.y + detection.h + pad, rows)))
+
+    def track(self, frame):
+        # Returns False as soon as a track is lost or when a full detection
+        # would convert fewer pixels than the windows
+        rows    = int(frame.shape[0] * vision.SCALE)
+        cols    = int(frame.shape[1] * vision.SCALE)
+        tracks  = [ t for t in self.tracks if t.detection.type != ObjectType.WALL ]
+        windows = MergeWindows([ self.window(t.detection, rows, cols) for t in tracks ])
+        area    = sum((x1 - x0) * (y1 - y0) for (x0, y0, x1, y1), _ in windows)
+        if area > self.max_area * rows * cols:
+            return False
+
+        for (x0, y0, x1, y1), members in windows:
+            roi = vision.Roi(int(y0 / vision.SCALE), int(x0 / vision.SCALE),
+                             int((cols - x1) / vision.SCALE), int((rows - y1) / vision.SCALE))
+            _, hsv, origin, capsize = vision.Preprocess(frame, roi)
+            if hsv.size == 0:
+                return False
+            self.colour_pixels += hsv.shape[0] * hsv.shape[1]
+
+            labels = vision.CLASSIFIER.classify(hsv, out=vision.Buffer('labels', hsv.shape[:2]))
+            vision.timer.lap('threshold')
+
+            # Blobs of each class in the window, shared by its tracks
+            found = {}
+            for t in (tracks[i] for i in members):
+                cls   = self.__classes[t.detection.type]
+                blobs = found.get(cls.label)
+                if blobs is None:
+                    mask  = cv2.compare(labels, cls.label, cv2.CMP_EQ, dst=vision.Buffer('track mask', labels.shape))
+                    vision.roi_stats['class_pixels'] += mask.size
+                    blobs = vision.FindBlobs(mask, cls, origin)
+                    found[cls.label] = blobs
+                if len(blobs.x) == 0:
+                    return False
+
+                # Follow the blob closest to where the track was
+                cx = t.detection.x + t.detection.w / 2
+                cy = t.detection.y + t.detection.h / 2
+                i  = int(np.argmin((blobs.cx - cx) ** 2 + (blobs.cy - cy) ** 2))
+                t.update(vision.Measure(cls, Blobs(*[ field[i:i + 1] for field in blobs ]), capsize)[0])
+
+        self.since_detect += 1
+        self.track_frames += 1
+        return True
@@ -0,0 +1,209 @@
+'''
+Tunes the colour ranges and blob extent thresholds against a labelled corpus.
+
+  python -m subsystems.vision.tune <corpus> [--rounds N] [--candidates N] [--calibration camera.json]
+                                   [--output vision_params.json]
+
+The corpus is a directory of frames with a labels.json that lists the boxes
+in each frame, in camera pixels on the flipped image like vision's ROIs:
+
+  { "frame_001.png": [ { "type": "sample", "box": [x, y, w, h] }, ... ] }
+
+Every frame is converted to HSV once up front and the worker processes share
+the converted corpus, so each candidate only re-classifies it. Each class is
+searched on its own, perturbing the best ranges and extent so far by a step
+that halves every round, and scored by F1 against the labels. Candidates are
+classified alongside the other classes' current ranges and cropped to the
+class ROIs, as vision does at runtime, so a range only scores the pixels it
+would win there. Pass the camera calibration to tune the tall classes over
+the ROIs they use with it.
+'''
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from ..interop import ObjectType
+from . import vision
+from .classifier import ColourClassifier
+from .tracker import IoU
+
+LABELS_FILE  = 'labels.json'
+DEFAULT_PATH = 'vision_params.json'
+
+# Overlap a detection needs with a labelled box to count as found
+MIN_IOU = 0.5
+
+# First round steps for the H, S and V bounds and for the extent
+RANGE_STEP  = np.array([4, 20, 20])
+EXTENT_STEP = 0.1
+HSV_LIMITS  = np.array([179, 255, 255])
+
+# Walls are fitted as lines rather than blobs, so have no boxes to score
+CLASSES = { c.type: c for c in vision.DETECTION_CLASSES if c.type != ObjectType.WALL }
+
+Box   = namedtuple('Box', 'x y w h')
+Score = namedtuple('Score', 'f1 precision recall')
+
+# Converted corpus and the class ROIs, shared with the worker processes and
+# set by _init_worker
+_corpus = None
+_rois   = None
+
+
+def LoadLabelledCorpus(path):
+    # Returns the HSV frames, for each frame a list of (ObjectType, Box) in
+    # processed-frame pixels, and the camera (width, height) of the frames
+    with open(os.path.join(path, LABELS_FILE)) as file:
+        labels = json.load(file)
+
+    frames = []
+    boxes  = []
+    size   = None
+    for name in sorted(labels):
+        frame = cv2.imread(os.path.join(path, name))
+        if frame is None:
+            continue
+        size = (frame.shape[1], frame.shape[0])
+        _, hsv, _, _ = vision.Preprocess(frame)
+        frames.append(hsv.copy()) # Preprocess reuses its buffers
+        boxes.append([ (ObjectType[l['type'].upper()], Box(*[ int(v * vision.SCALE) for v in l['box'] ]))
+                       for l in labels[name] ])
+    return frames, boxes, size
+
+
+def Classifier(label, ranges, current):
+    # The runtime classifier with one class's ranges replaced, so the
+    # candidate loses the pixels a higher priority class claims
+    return ColourClassifier([ (l, ranges if l == label else current[l]) for l, _ in vision.COLOUR_RANGES ])
+
+
+def Match(found, truth):
+    # Greedy one to one matching by overlap, returns the number of matches
+    unused  = list(found)
+    matched = 0
+    for t in truth:
+        best, best_iou = None, MIN_IOU
+        for f in unused:
+            iou = IoU(f, t)
+            if iou >= best_iou:
+                best, best_iou = f, iou
+        if best is not None:
+            unused.remove(best)
+            matched += 1
+    return matched
+
+
+def Evaluate(cls, classifier, frames, boxes):
+    tp = fp = fn = 0
+    for hsv, labelled in zip(frames, boxes):
+        mask = cv2.compare(classifier.classify(hsv), cls.label, cv2.CMP_EQ)
+        mask, origin = vision.ClassMask(mask, cls, vision.FULL_FRAME, (0, 0))
+        blobs = vision.FindBlobs(mask, cls, origin)
+        found = [ Box(*b) for b in zip(blobs.x.tolist(), blobs.y.tolist(), blobs.w.tolist(), blobs.h.tolist()) ]
+        truth = [ b for t, b in labelled if t == cls.type ]
+        matched = Match(found, truth)
+        tp += matched
+        fp += len(found) - matched
+        fn += len(truth) - matched
+
+    precision = tp / (tp + fp) if tp + fp > 0 else 0
+    recall    = tp / (tp + fn) if tp + fn > 0 else 0
+    f1        = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0
+    return Score(f1, precision, recall)
+
+
+def _init_worker(frames, boxes, rois):
+    global _corpus
+    global _rois
+    _corpus = (frames, boxes)
+    _rois   = rois
+
+
+def _score(candidate):
+    type, ranges, min_extent, current = candidate
+    cls = copy.copy(CLASSES[type])
+    cls.min_extent = min_extent
+    cls.roi        = _rois[type]
+    return Evaluate(cls, Classifier(cls.label, ranges, current), *_corpus)
+
+
+def Perturb(ranges, min_extent, step, rng):
+    moved = []
+    for lo, hi in ranges:
+        lo = np.clip(lo + rng.integers(-1, 2, 3) * np.maximum(RANGE_STEP * step, 1).astype(int), 0, HSV_LIMITS)
+        hi = np.clip(hi + rng.integers(-1, 2, 3) * np.maximum(RANGE_STEP * step, 1).astype(int), 0, HSV_LIMITS)
+        moved.append((np.minimum(lo, hi), np.maximum(lo, hi)))
+    extent = float(np.clip(min_extent + rng.uniform(-1, 1) * EXTENT_STEP * step, 0, 0.95))
+    return moved, round(extent, 3)
+
+
+def Tune(type, pool, rounds, candidates, rng, current):
+    # Returns the best (ranges, min_extent) found for one class and its
+    # score. current maps each label to the ranges the other classes use.
+    cls   = CLASSES[type]
+    best  = (current[cls.label], cls.min_extent)
+    score = pool.map(_score, [ (type,) + best + (current,) ])[0]
+
+    for r in range(rounds):
+        step   = 0.5 ** r
+        trials = [ Perturb(best[0], best[1], step, rng) for _ in range(candidates) ]
+        scores = pool.map(_score, [ (type,) + trial + (current,) for trial in trials ])
+        i = int(np.argmax([ s.f1 for s in scores ]))
+        if scores[i].f1 > score.f1:
+            best, score = trials[i], scores[i]
+        print('{} round {}: f1 {:.3f} precision {:.3f} recall {:.3f}'.format(type.name.title(), r + 1, *score))
+    return best, score
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune vision colour ranges and extents against labelled frames.')
+    parser.add_argument('corpus', help='Directory of frames with a {} file.'.format(LABELS_FILE))
+    parser.add_argument('--rounds', type=int, default=6, help='Search rounds per class, the step halves each round.')
+    parser.add_argument('--candidates', type=int, default=32, help='Candidates scored per round.')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the search.')
+    parser.add_argument('--calibration', default=None, help='Camera calibration the rover runs with, see calibration.py.')
+    parser.add_argument('--output', default=DEFAULT_PATH, help='Parameter file to write.')
+    args = parser.parse_args()
+
+    frames, boxes, size = LoadLabelledCorpus(args.corpus)
+    if len(frames) == 0:
+        print('No labelled frames found in {}'.format(args.corpus))
+        return
+
+    # The class ROIs vision would use on frames of this size
+    if args.calibration is not None and vision.LoadCalibration(args.calibration) is not None:
+        vision.UseGroundRois(*size)
+    rois = { type: cls.roi for type, cls in CLASSES.items() }
+
+    # Each class is tuned against the best ranges found so far for the others
+    current  = { label: [ (np.array(lo), np.array(hi)) for lo, hi in ranges ] for label, ranges in vision.COLOUR_RANGES }
+    labelled = { t for frame_boxes in boxes for t, _ in frame_boxes }
+    rng      = np.random.default_rng(args.seed)
+    params   = {}
+    with multiprocessing.Pool(args.processes, initializer=_init_worker, initargs=(frames, boxes, rois)) as pool:
+        for type in CLASSES:
+            if type not in labelled:
+                continue
+            (ranges, min_extent), score = Tune(type, pool, args.rounds, args.candidates, rng, current)
+            current[CLASSES[type].label] = ranges
+            params[type.name.lower()] = {
+                'ranges':     [ [ lo.tolist(), hi.tolist() ] for lo, hi in ranges ],
+                'min_extent': min_extent,
+                'precision':  round(score.precision, 3),
+                'recall':     round(score.recall, 3),
+            }
+
+    with open(args.output, 'w') as file:
+        json.dump(params, file, indent=2)
+    print('Saved {}'.format(os.path.abspath(args.output)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,285 +1,651 @@
 import cv2
+import json
 import numpy as np
 import random as rng
 import time
-from ..interop import DetectedObject, ObjectType
+from collections import namedtuple
+from ..interop import DETECTION, NO_TRACK, OBJECT_CODES, ObjectType, detection_batch, to_detection_batch
+from .calibration import Calibration
+from .capture import FrameGrabber
+from .blobs import ContourBlobs, ExtractBlobs, FilterBlobs, TranslateBlobs
+from .classifier import ColourClassifier
+from .debug import DebugSink
+from .sources import CameraSource, OpenSource
+from .timing import NullTimer, StageHistograms
+from . import walls
+
+ORANGE_MIN = np.array([170, 70,80])
+ORANGE_MAX = np.array([179, 255, 255])
+
+ORANGE_MIN1 = np.array([0, 70, 80])
+ORANGE_MAX1 = np.array([10, 255, 255])
+
+BLUE_MIN = np.array([100,80,30])
+BLUE_MAX = np.array([110,255,255])
+
+GREEN_MIN = np.array([35,60,25])
+GREEN_MAX = np.array([55,255,255])
+
+YELLOW_MIN = np.array([20,50,50])
+YELLOW_MAX = np.array([35,255,255])
+
+BLACK_MIN = np.array([0,0,0])
+BLACK_MAX = np.array([179,100,30])
+
+LABEL_ORANGE = 1
+LABEL_BLUE   = 2
+LABEL_GREEN  = 3
+LABEL_YELLOW = 4
+LABEL_BLACK  = 5
+
+# Listed in priority order. Black only wins on dark pixels none of the
+# coloured ranges claim.
+COLOUR_RANGES = [
+    (LABEL_ORANGE, [(ORANGE_MIN, ORANGE_MAX), (ORANGE_MIN1, ORANGE_MAX1)]),
+    (LABEL_BLUE,   [(BLUE_MIN,   BLUE_MAX)]),
+    (LABEL_GREEN,  [(GREEN_MIN,  GREEN_MAX)]),
+    (LABEL_YELLOW, [(YELLOW_MIN, YELLOW_MAX)]),
+    (LABEL_BLACK,  [(BLACK_MIN,  BLACK_MAX)]),
+]
+
+CLASSIFIER = ColourClassifier(COLOUR_RANGES)
        
 
-def Initialize():
-    cap = cv2.VideoCapture(0)
+# Processing resolution relative to the camera resolution. Change it with
+# SetScale so the pixel constants follow.
+SCALE = 0.5
+
+# Scales the adaptive resolution mode moves between, lowest first. Pixel
+# limits in DETECTION_CLASSES are tuned at BASE_SCALE.
+BASE_SCALE = 0.5
+SCALES     = (0.25, 0.35, 0.5)
+
+# Blobs must extend below this row (at full camera resolution) to be counted
+HORIZON = 150
+
+# Pixels per degree of bearing at full camera resolution
+BEARING_PIXELS_PER_DEGREE = 7.25
+
+# Flip code passed to cv2.flip, None to disable. The camera is mounted upside down.
+FLIP = 0
+
+# Region of interest in full camera resolution pixels, measured on the
+# flipped image. Rows above top, rows inside the bottom margin and columns
+# inside the side margins are cut before any colour processing.
+Roi = namedtuple('Roi', 'top left right bottom', defaults=[0])
+
+FULL_FRAME = Roi(0, 0, 0)
+
+# Short objects never rise far above the horizon rule, so their masks skip
+# most of the sky. Tall objects can, and their uncalibrated distance comes
+# from their full height, so they only skip the top rows once calibration
+# gives every blob that passes the horizon rule a ground range. See
+# UseGroundRois(). Walls need the whole frame for their height gate.
+ROI_SHORT = Roi(HORIZON - 50, 0, 0)
+ROI_TALL  = Roi(HORIZON - 100, 0, 0)
+
+class DetectionClass:
+    def __init__(self, type, label, min_size, min_extent, distance_factor,
+                 min_area=0, blur=5, horizon=True, bearing=True, orientation=True, roi=FULL_FRAME, ground_roi=None):
+        self.type            = type
+        self.label           = label
+        self.min_size        = min_size        # Minimum blob width and height (pixels)
+        self.min_extent      = min_extent      # Minimum blob area / bounding box area
+        self.min_area        = min_area
+        self.distance_factor = distance_factor # Distance = SCALE * distance_factor / height
+        self.blur            = blur
+        self.horizon         = horizon
+        self.bearing         = bearing
+        self.orientation     = orientation
+        self.roi             = roi
+        self.ground_roi      = ground_roi      # Replaces roi when blob distances come from the ground range
+
+DETECTION_CLASSES = [
+    DetectionClass(ObjectType.OBSTACLE, LABEL_GREEN,  30, 0.7, 8200, ground_roi=ROI_TALL),
+    DetectionClass(ObjectType.ROCK,     LABEL_BLUE,   30, 0.6, 4400, roi=ROI_SHORT),
+    DetectionClass(ObjectType.SAMPLE,   LABEL_ORANGE, 10, 0.4, 2600, blur=0, orientation=False, roi=ROI_SHORT),
+    DetectionClass(ObjectType.LANDER,   LABEL_YELLOW, 30, 0.3, 5000, min_area=1000, orientation=False,
+                   ground_roi=ROI_TALL),
+    DetectionClass(ObjectType.WALL,     LABEL_BLACK,  80, 0.3, 1000, min_area=10000,
+                   horizon=False, bearing=False, orientation=False),
+]
+
+# Pixel constants for one processing scale. Lengths scale linearly with the
+# resolution and areas with its square.
+ScaleProfile = namedtuple('ScaleProfile', 'scale horizon bearing_ppd limits')
+ClassLimits  = namedtuple('ClassLimits', 'min_size min_area blur')
+
+# Report walls as line segments fitted to where they meet the floor rather
+# than as one blob. Segment endpoints for the last frame are kept in
+# wall_points.
+WALL_LINES = True
+
+# 'components' labels blobs with connectedComponentsWithStats, 'contours'
+# traces them with findContours like the original per-colour loops did
+BLOB_EXTRACTION = 'components'
+
+# Raw detection in processed-frame pixel coordinates
+Detection = namedtuple('Detection', 'type x y w h bearing distance orientation')
+
+# Frames darker than this are brightened before thresholding. Measured as in
+# Brightness().
+MINIMUM_BRIGHTNESS = 1.1
+MAX_GAIN           = 3
+BRIGHTNESS_STEP    = 8
+
+debug_sink  = None
+tracker     = None
+governor    = None # Adaptive resolution, see resolution.py
+calibration = None # Bearing and ground range tables, see calibration.py
+timer       = NullTimer() # Replace to time each pipeline stage
+gain_luts   = {}
+wall_points = np.zeros((0, 2, 2), dtype=np.float32) # (distance, bearing) endpoints of each wall segment
+profiles    = {}
+profile     = None # Pixel constants for SCALE, set below
+buffers     = {} # Intermediate images reused across frames, see Buffer()
+
+# Frames between detections of each ObjectType, set with SetSchedule.
+# Classes not listed are detected every frame, 0 disables a class.
+schedule    = {}
+frame_index = 0
+
+# Conversion for the colour order of the frame source, set in Initialize
+hsv_conversion = cv2.COLOR_BGR2HSV
+
+# Pixel counts used to report how much work the ROIs save
+roi_stats = { 'frames': 0, 'frame_pixels': 0, 'colour_pixels': 0, 'class_pixels': 0, 'class_frame_pixels': 0 }
+
+
+def Initialize(source=0, threaded=None, debug=False, tracking=0, calibration_path=None, target_fps=0, params_path=None,
+               telemetry=False, resolution=None):
+    global debug_sink
+    global tracker
+    global governor
+    global hsv_conversion
+    global timer
+
+    # Keep per-stage latency histograms, see Telemetry()
+    if telemetry:
+        timer = StageHistograms()
+
+    # Use measured geometry when the camera has been calibrated
+    if calibration_path is not None:
+        LoadCalibration(calibration_path)
+
+    # Use tuned colour ranges and extents, see tune.py
+    if params_path is not None:
+        LoadParams(params_path)
+
+    # Only render detections when asked to. A headless rover never draws.
+    if debug and debug_sink is None:
+        debug_sink = DebugSink().start()
+
+    # Full detection every `tracking` frames, follow blobs in between
+    if tracking > 0:
+        from .tracker import Tracker
+        tracker = Tracker(tracking)
+
+    # Trade resolution for frame rate. Tracks are kept in processed-frame
+    # pixels, so tracking stays at a fixed scale.
+    if target_fps > 0 and tracker is None:
+        from .resolution import AdaptiveResolution
+        governor = AdaptiveResolution(target_fps)
+
+    # Camera index, video file or raw .npy frame file
+    cap = OpenSource(source)
     # Check if camera opened successfully
 
     if (cap.isOpened() == False):
         print("Error opening video stream or file")
+        return cap
+
+    hsv_conversion = cap.hsv_conversion
+
+    # Ask for the (width, height) the caller sized its buffers for. Sources
+    # that can't change size keep their own.
+    if resolution is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+
+    # Build the geometry tables now rather than on the first detection. A
+    # source that hasn't reported its size yet builds them when first used.
+    width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if calibration is not None and width > 0 and height > 0:
+        for scale in (SCALES if governor is not None else [ SCALE ]):
+            calibration.tables(int(width * scale), int(height * scale))
+        UseGroundRois(width, height)
+    elif calibration is not None:
+        print('Frame size unknown, tall classes keep the full frame')
+
+    # Read the camera on a background thread so detection never waits on it.
+    # Files are read in step with detection so replays see every frame.
+    live = isinstance(cap, CameraSource)
+    if threaded or (threaded is None and live):
+        cap = FrameGrabber(cap, live=live).start()
     return cap
 
 
-def ObjectDetection(cap):
-    ret, frame = cap.read()
-    objects = []
-    if ret == True:
-            newtime = time.time()
-            # Display the resulting frame
-            # image = cv2.imread("image.png")
-            # hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            scale = 0.5
-            frame = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)))
-            frame = cv2.flip(frame,0)
-            # frame = cv2.flip(frame,1)
-
-
-
-            # BRIGHTNESS ADJUSTING
-
-
-        
-            cols, rows = frame.shape[:-1]
-            brightness = np.sum(frame) / (255 * cols * rows)
-
-            minimum_brightness = 1.1
-            
-            ratio = brightness / minimum_brightness
-
-            if ratio >= 1:
-                pass
-            elif ratio >= 1.3:
-                cv2.convertScaleAbs(frame, alpha = 1 / ratio, beta = 0)
-                return []
-            else:    
-                pass
-                # Otherwise, adjust brightness to get the target brightness
-                cv2.convertScaleAbs(frame, alpha = 1 / ratio, beta = 0)
-                return []
-
-            
-            capwidth = frame.shape[1]
-            # print(frame.shape)
-            hsv_stream = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            
-
-            ORANGE_MIN = np.array([170, 70,80])
-            ORANGE_MAX = np.array([179, 255, 255])
-
-            ORANGE_MIN1 = np.array([0, 70, 80])
-            ORANGE_MAX1 = np.array([10, 255, 255])
-
-            BLUE_MIN = np.array([100,80,30])
-            BLUE_MAX = np.array([110,255,255])
-
-            GREEN_MIN = np.array([35,60,25])
-            GREEN_MAX = np.array([55,255,255])
-
-            YELLOW_MIN = np.array([20,50,50])
-            YELLOW_MAX = np.array([35,255,255])
-
-            BLACK_MIN = np.array([0,0,0])
-            BLACK_MAX = np.array([179,100,30])
-
-            hsv_thresholded_orange1 = cv2.inRange(hsv_stream, ORANGE_MIN, ORANGE_MAX)
-            hsv_thresholded_orange2 = cv2.inRange(hsv_stream, ORANGE_MIN1, ORANGE_MAX1)
-            hsv_thresholded_orange = hsv_thresholded_orange1 + hsv_thresholded_orange2
-            
-            hsv_thresholded_blue = cv2.inRange(hsv_stream, BLUE_MIN, BLUE_MAX)
-            
-            hsv_thresholded_green = cv2.inRange(hsv_stream, GREEN_MIN, GREEN_MAX)
-
-            hsv_thresholded_yellow = cv2.inRange(hsv_stream, YELLOW_MIN, YELLOW_MAX)
-            hsv_thresholded_black = cv2.inRange(hsv_stream, BLACK_MIN, BLACK_MAX)
-
-            
-
-            # green
-            canny_edge_green  = cv2.blur(hsv_thresholded_green, (5, 5))
-            _,contours, hierarchy = cv2.findContours(canny_edge_green,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                rect = cv2.boundingRect(c)
-                if rect[2] < 30 or rect[3] < 30: continue
-                
-                x,y,w,h = rect
-                Extent = (cv2.contourArea(c)/(w*h))
-                if Extent > 0.7 and ((y+h)>(150*scale)):
-                    cv2.rectangle(canny_edge_green,(x,y),(x+w,y+h),(150,255,0),2)
-                    if(x>(cap.get(3)/2)):
-                         xtext = x
-                    else:
-                         xtext = x 
-                    Oriantation = round(h/w,2)
-                    if Oriantation >1:
-                        Oriantation = 1
-                    Oriantation = round(90*(float(Oriantation))**3.5,3)
-                    
-                    if Oriantation > 85:
-                        OriantationStr = "Straight"
-                    else:
-                        OriantationStr = str(Oriantation)
-                    
-                    cv2.putText(canny_edge_green,('Oriantation: '+OriantationStr),(xtext+w+10,y-10),0,0.3,(150,255,0))
-                    cv2.putText(canny_edge_green,('Green, Height:'+str(h)),(xtext+w+10,y+h),0,0.3,(150,255,0))
-                    D_DetermanentG = scale * 8200
-                    Distance = round((D_DetermanentG/h),2)
-                    cv2.putText(canny_edge_green,('Distance'+str(Distance)),(xtext+w+10,y-20),0,0.3,(150,255,0))
-                    #capwidth  = cap.get(3)
-                    Bearing = (((x+(w/2))-(capwidth/2))/(7.25*scale))
-                    Bearing1 = round(Bearing,2)
-                    cv2.putText(canny_edge_green,('Bearing'+str(Bearing1)),(xtext+w+10,y-30),0,0.3,(150,255,0))
-
-                    objects.append(DetectedObject(ObjectType.OBSTACLE,(Bearing1),Distance,Oriantation)) #0 placeholder for orientation
-
-
-            #blue
-            canny_edge_blue = cv2.blur(hsv_thresholded_blue, (5,5))
-            _, contoursb, hierarchy = cv2.findContours(canny_edge_blue,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-            for c in contoursb:
-                rect = cv2.boundingRect(c)
-                if rect[2] < 30 or rect[3] < 30: continue
-               
-                x,y,w,h = rect
-                Extent = (cv2.contourArea(c)/(w*h))
-                if Extent > 0.6 and ((y+h)>(150*scale)):
-                    cv2.rectangle(canny_edge_blue,(x,y),(x+w,y+h),(150,255,0),2)
-                    if(x>(cap.get(3)/2)):
-                         xtext = x
-                    else:
-                         xtext = x 
-                    cv2.putText(canny_edge_blue,('Blue, Height:'+str(h)),(x+w+10,y+h),0,0.3,(150,0,0))
-                    Oriantation = round(h/w,2)
-                    if Oriantation >1:
-                        Oriantation = 1
-                    Oriantation = round(90*(float(Oriantation))**3.5,3)
-                    if Oriantation > 85:
-                        OriantationStr = "Straight"
-                    else:
-                        OriantationStr = str(Oriantation)
-                    cv2.putText(canny_edge_blue,('Oriantation: '+OriantationStr),(xtext+w+10,y-10),0,0.3,(150,255,0))
-                    D_DetermanentB = scale * 4400
-                    Distance = round((D_DetermanentB/h),2)
-                    cv2.putText(canny_edge_blue,('Distance: '+str(Distance)),(xtext+w+10,y-20),0,0.3,(150,255,0))
-                    # capwidth  = cap.get(3)
-                    Bearing = (((x+(w/2))-(capwidth/2))/(7.25*scale))
-                    Bearing1 = round(Bearing,2)
-                    cv2.putText(canny_edge_blue,('Bearing: '+str(Bearing1)),(xtext+w+10,y-30),0,0.3,(150,255,0))
-
-                    objects.append(DetectedObject(ObjectType.ROCK,Bearing1,Distance,Oriantation)) #0 placeholder for orientation
-
-
-            #Orange
-            canny_edge_orange = hsv_thresholded_orange # cv2.blur(hsv_thresholded_orange, (10,10))
-            _, contourso, hierarchy = cv2.findContours(canny_edge_orange,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-            for c in contourso:
-                 rect = cv2.boundingRect(c)
-                 if rect[2] < 10 or rect[3] < 10: continue
-                 
-                 x,y,w,h = rect
-                 Extent = (cv2.contourArea(c)/(w*h))
-                 if Extent > 0.4 and ((y+h)>(150*scale)):
-                     cv2.rectangle(canny_edge_orange,(x,y),(x+w,y+h),(150,255,0),2)
-                     if(x>(cap.get(3)/2)):
-                         xtext = x
-                     else:
-                         xtext = x 
-                     
-                     cv2.putText(canny_edge_orange,('Orange, Height:'+str(h)),(xtext+w+10,y+h),0,0.3,(150,255,0))
-                     D_DetermanentO = scale * 2600
-                     Distance = round((D_DetermanentO/h),2)
-                     cv2.putText(canny_edge_blue,('Distance'+str(Distance)),(xtext+w+10,y-20),0,0.3,(150,255,0))
-                     # capwidth  = cap.get(3)
-                     Bearing = ((x+(w/2))-(capwidth/2))/(7.25*scale)
-                     Bearing1 = round(Bearing,2)
-                     cv2.putText(canny_edge_orange,('Bearing'+str(Bearing1)),(xtext+w+10,y-30),0,0.3,(150,255,0))
-
-                     objects.append(DetectedObject(ObjectType.SAMPLE,(Bearing1),Distance,0)) #0 placeholder for orientation
-            
-            #Yellow
-            canny_edge_yellow = cv2.blur(hsv_thresholded_yellow, (5,5))
-            _, contourso, hierarchy = cv2.findContours(canny_edge_yellow,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-            for c in contourso:
-                 rect = cv2.boundingRect(c)
-                 if rect[2] < 30 or rect[3] < 30: continue
-                
-                 x,y,w,h = rect
-                 Extent = (cv2.contourArea(c)/(w*h))
-                 if Extent > 0.3 and cv2.contourArea(c) > 1000 and ((y+h)>(150*scale)):
-                     cv2.rectangle(canny_edge_yellow,(x,y),(x+w,y+h),(150,255,0),2)
-                     if(x>(cap.get(3)/2)):
-                         xtext = x
-                     else:
-                         xtext = x 
-                     
-                     cv2.putText(canny_edge_yellow,('Yellow, Height:'+str(h)),(xtext+w+10,y+h),0,0.3,(150,255,0))
-                     D_DetermanentY = scale * 5000
-                     Distance = int(round((D_DetermanentY/h),2))
-                     cv2.putText(canny_edge_yellow,('Distance'+str(Distance)),(xtext+w+10,y-20),0,0.3,(150,255,0))
-                     #capwidth  = cap.get(3)
-                     Bearing = ((x+(w/2))-(capwidth/2))/(7.25*scale)
-                     Bearing1 = round(Bearing,2)
-                     cv2.putText(canny_edge_yellow,('Bearing'+str(Bearing1)),(x+w+10,y-30),0,0.3,(150,255,0))
-
-                     objects.append(DetectedObject(ObjectType.LANDER,(Bearing1),Distance,0)) #0 placeholder for orientation
-
-
-            #Black
-            canny_edge_black = cv2.blur(hsv_thresholded_black, (5,5))
-            _, contourso, hierarchy = cv2.findContours(canny_edge_black,cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-            for c in contourso:
-                 rect = cv2.boundingRect(c)
-                 if rect[2] < 80 or rect[3] < 80: continue
-                
-                 x,y,w,h = rect
-                 Extent = (cv2.contourArea(c)/(w*h))
-                 if Extent > 0.3 and cv2.contourArea(c) > 10000:
-                     cv2.rectangle(canny_edge_black,(x,y),(x+w,y+h),(150,255,0),2)
-                     if(x>(cap.get(3)/2)):
-                         xtext = x   
-                     else:
-                         xtext = x   
-                     #print(str(cv2.contourArea(c))
-                     cv2.putText(canny_edge_black,('Black, Height:'+str(h)),(xtext+w+10,y+h),0,0.3,(150,255,0))
-                     B_DetermanentO = scale * 1000
-                     Distance = int(round((B_DetermanentO/h),2))
-                     cv2.putText(canny_edge_black,('Distance'+str(Distance)),(xtext+w+10,y-20),0,0.3,(150,255,0))
-            
-                     objects.append(DetectedObject(ObjectType.WALL,0,Distance,0)) #0 placeholder for orientation
-
+def LoadCalibration(path):
+    global calibration
+    try:
+        calibration = Calibration.load(path)
+    except (OSError, KeyError) as ex:
+        print('Using default camera geometry. Failed to load calibration: {}'.format(ex))
+    return calibration
+
+
+def UseGroundRois(width, height):
+    '''
+    Switches the tall classes to their ground_roi if the calibration gives a
+    ground range at the horizon rule for a width x height camera. Every blob
+    that passes the rule is then placed by its bottom row, and cutting its
+    top no longer changes its distance. Returns whether they were switched.
+    '''
+    if calibration is None:
+        return False
+    _, ground_range = calibration.tables(width, height)
+    if not np.isfinite(ground_range[min(HORIZON, height - 1)]):
+        print('Calibrated horizon is below the horizon rule, tall classes keep the full frame')
+        return False
+
+    for cls in DETECTION_CLASSES:
+        if cls.ground_roi is not None:
+            cls.roi = cls.ground_roi
+    return True
+
+
+def LoadParams(path):
+    '''
+    Replaces the colour ranges and blob extent thresholds with those in a
+    parameter file written by tune.py. Classes missing from the file keep
+    their defaults.
+    '''
+    global CLASSIFIER
+    try:
+        with open(path) as file:
+            params = json.load(file)
+    except (OSError, ValueError) as ex:
+        print('Using default vision parameters. Failed to load {}: {}'.format(path, ex))
+        return False
+
+    ranges = dict(COLOUR_RANGES)
+    for cls in DETECTION_CLASSES:
+        p = params.get(cls.type.name.lower())
+        if p is None:
+            continue
+        cls.min_extent    = p['min_extent']
+        ranges[cls.label] = [ (np.array(lo), np.array(hi)) for lo, hi in p['ranges'] ]
+
+    CLASSIFIER = ColourClassifier([ (label, ranges[label]) for label, _ in COLOUR_RANGES ])
+    return True
+
+
+def Profile(scale):
+    profile = profiles.get(scale)
+    if profile is None:
+        ratio  = scale / BASE_SCALE
+        limits = {}
+        for cls in DETECTION_CLASSES:
+            blur = max(int(round(cls.blur * ratio)), 1) if cls.blur > 0 else 0
+            limits[cls.type] = ClassLimits(cls.min_size * ratio, cls.min_area * ratio ** 2, blur)
+        profile = ScaleProfile(scale, HORIZON * scale, BEARING_PIXELS_PER_DEGREE * scale, limits)
+        profiles[scale] = profile
+    return profile
+
+
+def SetScale(scale):
+    global SCALE
+    global profile
+    SCALE   = scale
+    profile = Profile(scale)
+
+# Build the presets up front so switching scale never builds one mid-run
+for scale in SCALES:
+    Profile(scale)
+SetScale(SCALE)
+
+
+def SetSchedule(intervals):
+    global schedule
+    schedule = dict(intervals)
+
+
+def DueClasses():
+    # Classes to detect in the current frame. Classes sharing an interval
+    # are staggered so their frames don't coincide.
+    due = []
+    for i, cls in enumerate(DETECTION_CLASSES):
+        interval = schedule.get(cls.type, 1)
+        if interval > 0 and (frame_index + i) % interval == 0:
+            due.append(cls)
+    return due
+
+
+def NextClasses():
+    # Classes due in the next frame, advancing the schedule by one frame
+    global frame_index
+    classes      = DueClasses()
+    frame_index += 1
+    return classes
+
+
+def Brightness(frame):
+    # Sum of the mean channel values, scaled so a white frame reads 3. Only
+    # every BRIGHTNESS_STEP-th row and column is sampled.
+    sample = frame[::BRIGHTNESS_STEP, ::BRIGHTNESS_STEP]
+    return sample.mean() * 3 / 255
+
+
+def GainLut(gain):
+    # Gains are quantised so a handful of tables covers every frame
+    gain = round(gain, 1)
+    lut  = gain_luts.get(gain)
+    if lut is None:
+        lut = np.clip(np.arange(256) * gain, 0, 255).astype(np.uint8)
+        gain_luts[gain] = lut
+    return lut
+
+
+def Buffer(key, shape, dtype=np.uint8):
+    # Destination for an intermediate image, as a contiguous view of a flat
+    # buffer that only ever grows. Changing the processing resolution or
+    # ROI, or following tracking windows of every size, reuses the largest
+    # buffer seen so far instead of allocating.
+    size   = int(np.prod(shape))
+    buffer = buffers.get(key)
+    if buffer is None or buffer.size < size or buffer.dtype != dtype:
+        buffer = np.empty(size, dtype=dtype)
+        buffers[key] = buffer
+    return buffer[:size].reshape(shape)
+
+
+def UnionRoi(classes):
+    return Roi(min(c.roi.top    for c in classes),
+               min(c.roi.left   for c in classes),
+               min(c.roi.right  for c in classes),
+               min(c.roi.bottom for c in classes))
+
+
+def CropSource(frame, roi):
+    # The ROI is measured on the flipped image, so mirror it back onto the
+    # raw frame before cropping.
+    rows, cols = frame.shape[:2]
+    y0, y1 = roi.top, rows - roi.bottom
+    x0, x1 = roi.left, cols - roi.right
+    if FLIP in (0, -1):
+        y0, y1 = rows - y1, rows - y0
+    if FLIP in (1, -1):
+        x0, x1 = cols - x1, cols - x0
+    return frame[y0:y1, x0:x1]
+
+
+def Preprocess(frame, roi=FULL_FRAME):
+    # Returns the processed BGR frame, its HSV conversion, the processed-frame
+    # pixel coordinates of its top left corner and the full processed
+    # (width, height). The frame and HSV images are reused by the next call.
+    capsize  = (int(frame.shape[1] * SCALE), int(frame.shape[0] * SCALE))
+    origin   = (int(roi.left * SCALE), int(roi.top * SCALE))
+    frame    = CropSource(frame, roi)
+
+    size    = (int(frame.shape[1] * SCALE), int(frame.shape[0] * SCALE))
+    resized = Buffer('resize', (size[1], size[0], 3))
+    frame   = cv2.resize(frame, size, dst=resized)
+    timer.lap('resize')
+    if FLIP is not None:
+        frame = cv2.flip(resized, FLIP, dst=Buffer('flip', resized.shape))
+    timer.lap('flip')
+
+    # BRIGHTNESS ADJUSTING
+    ratio = Brightness(frame) / MINIMUM_BRIGHTNESS
+    if ratio < 1:
+        # Brighten dim frames up to the target and keep going
+        cv2.LUT(frame, GainLut(1 / max(ratio, 1 / MAX_GAIN)), dst=frame)
+    timer.lap('brightness')
+
+    hsv_stream = cv2.cvtColor(frame, hsv_conversion, dst=Buffer('hsv', frame.shape))
+    timer.lap('cvtColor')
+    return frame, hsv_stream, origin, capsize
+
+
+def ClassMask(mask, cls, roi, origin):
+    # Narrow a mask of the frame cropped to roi down to the class ROI. Returns
+    # the view and the processed-frame coordinates of its top left corner.
+    x0 = int((cls.roi.left  - roi.left)  * SCALE)
+    y0 = int((cls.roi.top   - roi.top)   * SCALE)
+    x1 = mask.shape[1] - int((cls.roi.right  - roi.right)  * SCALE)
+    y1 = mask.shape[0] - int((cls.roi.bottom - roi.bottom) * SCALE)
+    return mask[y0:y1, x0:x1], (origin[0] + x0, origin[1] + y0)
+
+
+def FindBlobs(mask, cls, origin=(0, 0)):
+    limits = profile.limits[cls.type]
+    if limits.blur > 0:
+        mask = cv2.blur(mask, (limits.blur, limits.blur), dst=Buffer(('blur', cls.label), mask.shape))
+
+    if BLOB_EXTRACTION == 'contours':
+        blobs = ContourBlobs(mask)
+    else:
+        blobs = ExtractBlobs(mask)
+    blobs = TranslateBlobs(blobs, origin[0], origin[1])
+
+    horizon = profile.horizon if cls.horizon else None
+    blobs   = FilterBlobs(blobs, limits.min_size, cls.min_extent, limits.min_area, horizon)
+    timer.lap('blobs')
+    return blobs
+
+
+def Measure(cls, blobs, capsize):
+    x, y, w, h = blobs.x, blobs.y, blobs.w, blobs.h
+
+    # Pinhole height model, used for blobs the ground plane can't place
+    Distance = SCALE * cls.distance_factor / h
+
+    if calibration is not None:
+        bearing_table, range_table = calibration.tables(*capsize)
+        if cls.bearing:
+            Bearing = bearing_table[np.clip(x + w // 2, 0, capsize[0] - 1)]
+        else:
+            Bearing = np.zeros(len(x))
+        # Range to where the bottom of the blob meets the floor
+        Ground   = range_table[np.clip(y + h - 1, 0, capsize[1] - 1)]
+        Distance = np.where(np.isfinite(Ground), Ground, Distance)
+    elif cls.bearing:
+        Bearing = ((x + w / 2) - capsize[0] / 2) / profile.bearing_ppd
+    else:
+        Bearing = np.zeros(len(x))
+
+    Distance = np.round(Distance, 2)
+    Bearing  = np.round(Bearing, 2)
+
+    if cls.orientation:
+        Oriantation = np.minimum(np.round(h / w, 2), 1)
+        Oriantation = np.round(90 * Oriantation ** 3.5, 3)
+    else:
+        Oriantation = np.zeros(len(x))
+
+    detections = [ Detection(cls.type, *values) for values in zip(
+        x.tolist(), y.tolist(), w.tolist(), h.tolist(),
+        Bearing.tolist(), Distance.tolist(), Oriantation.tolist()) ]
+    timer.lap('geometry')
+    return detections
+
+
+def FindWalls(mask, cls, origin, capsize):
+    # One detection per wall segment, placed at the point on the segment
+    # nearest the rover, with how squarely the rover faces it as its
+    # orientation. Their endpoints are kept in wall_points.
+    global wall_points
+    ratio  = SCALE / BASE_SCALE
+    limits = profile.limits[cls.type]
+    if limits.blur > 0:
+        mask = cv2.blur(mask, (limits.blur, limits.blur), dst=Buffer(('blur', cls.label), mask.shape))
+
+    step = max(int(round(walls.COLUMN_STEP * ratio)), 1)
+    columns, rows, heights = walls.ColumnBoundary(mask, step, walls.MIN_HEIGHT * ratio)
+    segments = walls.FitSegments(columns, rows, heights, step, walls.MAX_JUMP * ratio, walls.EPSILON * ratio,
+                                 walls.MIN_AREA * ratio ** 2, walls.MIN_LENGTH * ratio)
+    timer.lap('blobs')
+
+    # Wall height at each endpoint for the pinhole fallback
+    height = heights[np.searchsorted(columns, segments[..., 0])]
+    u = segments[..., 0] + origin[0]
+    v = segments[..., 1] + origin[1]
+
+    Distance = SCALE * cls.distance_factor / height
+    if calibration is not None:
+        bearing_table, range_table = calibration.tables(*capsize)
+        Bearing  = bearing_table[np.clip(u, 0, capsize[0] - 1)]
+        Ground   = range_table[np.clip(v, 0, capsize[1] - 1)]
+        Distance = np.where(np.isfinite(Ground), Ground, Distance)
+    else:
+        Bearing = (u - capsize[0] / 2) / profile.bearing_ppd
+
+    wall_points = np.stack([ Distance, Bearing ], axis=-1).astype(np.float32)
+    Nearest, Heading, Facing = walls.ClosestPoint(Distance, Bearing)
+
+    x0, y0 = u.min(axis=1), v.min(axis=1)
+    x1, y1 = u.max(axis=1), v.max(axis=1)
+    detections = [ Detection(cls.type, *values) for values in zip(
+        x0.tolist(), y0.tolist(), (x1 - x0).tolist(), (y1 - y0).tolist(),
+        np.round(Heading, 2).tolist(), np.round(Nearest, 2).tolist(), np.round(Facing, 2).tolist()) ]
+    timer.lap('geometry')
+    return detections
+
+
+def WallPoints():
+    # Wall segments from the last frame as [[distance, bearing], [distance, bearing]]
+    # endpoint pairs, like the simulator's GetDetectedWallPoints
+    return wall_points.tolist()
+
+
+def Detect(hsv_stream, roi=FULL_FRAME, origin=(0, 0), capsize=None, classes=DETECTION_CLASSES):
+    # Label every pixel once for all classes, then find blobs in each class
+    labels = CLASSIFIER.classify(hsv_stream, out=Buffer('labels', hsv_stream.shape[:2]))
+    return DetectLabels(labels, roi, origin, capsize, classes)
+
+
+def DetectLabels(labels, roi=FULL_FRAME, origin=(0, 0), capsize=None, classes=DETECTION_CLASSES):
+    if capsize is None:
+        capsize = (labels.shape[1], labels.shape[0])
+
+    # Only the scheduled classes need a mask
+    wanted = [ cls.label for cls in classes ]
+    masks  = CLASSIFIER.masks(labels, wanted, out=Buffer('masks', (len(wanted),) + labels.shape))
+    timer.lap('threshold')
+
+    detections = []
+    for cls in classes:
+        mask, mask_origin = ClassMask(masks[cls.label], cls, roi, origin)
+        roi_stats['class_pixels'] += mask.size
+        if cls.type == ObjectType.WALL and WALL_LINES:
+            detections += FindWalls(mask, cls, mask_origin, capsize)
+        else:
+            detections += Measure(cls, FindBlobs(mask, cls, mask_origin), capsize)
+    return detections
+
+
+def RoiSavings():
+    # Fraction of pixels the ROIs kept out of colour conversion and out of
+    # the per-class blob extraction
+    if roi_stats['frames'] == 0:
+        return 0, 0
+    colour = 1 - roi_stats['colour_pixels'] / roi_stats['frame_pixels']
+    blobs  = 1 - roi_stats['class_pixels'] / roi_stats['class_frame_pixels']
+    return round(colour, 3), round(blobs, 3)
+
+
+def DetectionBatch(detections, timestamp):
+    return np.array([ (OBJECT_CODES[d.type], d.bearing, d.distance, d.orientation, timestamp, NO_TRACK) for d in detections ],
+                    dtype=DETECTION)
 
-            if ((time.time()-newtime)!=0):
-                Freq = round(1/(time.time()-newtime),1)
-            else:
-                Freq = 0
 
-
-            img = canny_edge_blue + canny_edge_green + canny_edge_orange + canny_edge_yellow 
-            
-            cv2.putText(img,('Frequency: '+str(Freq)+"Hz"),(30,30),0,0.3,(150,255,0))
-
-            #cv2.imshow('Frame', hsv_stream)
-            #cv2.imshow('Frame_Threshold_Orange', hsv_thresholded_orange)
-            #cv2.imshow('Frame_Threshold_Blue', hsv_thresholded_blue)
-            #cv2.imshow('Frame_Threshold_Green', hsv_thresholded_green)
-            #cv2.imshow('Frame_Threshold_Greenlines', canny_edge_green)
-            cv2.imshow('Frame_Detections', img)
-            #cv2.imshow('walls',  canny_edge_black)
-            # cv2.imshow('Frame_Threshold_edges_orange',  orange_edges)
-
-    cv2.waitKey(1)
-    return objects
+def ObjectDetection(cap):
+    # Returns the detections in the next frame as an interop DETECTION batch
+    ret, frame = cap.read()
+    if ret != True:
+        return detection_batch()
+
+    newtime = time.time()
+    if tracker is not None:
+        timer.start()
+        start   = time.perf_counter()
+        objects = tracker.update(frame)
+        elapsed = time.perf_counter() - start
+        timer.finish()
+
+        # Tracking frames are never converted whole, so only build a frame
+        # to draw on when the debug view is about to take one
+        if debug_sink is not None and debug_sink.ready():
+            debug_sink.submit(DebugFrame(frame), tracker.detections(), round(1/elapsed, 1) if elapsed != 0 else 0)
+        return to_detection_batch(objects, newtime, [ t.id for t in tracker.tracks ])
+
+    start = time.perf_counter()
+    frame, detections, origin = ProcessFrame(frame)
+    elapsed = time.perf_counter() - start
+
+    if governor is not None:
+        scale = governor.update(elapsed, detections)
+        if scale != SCALE:
+            SetScale(scale)
+
+    if debug_sink is not None:
+        debug_sink.submit(frame, detections, round(1/elapsed, 1) if elapsed != 0 else 0, origin)
+
+    return DetectionBatch(detections, newtime)
+
+
+def Telemetry():
+    # Latency and frame rate report, None unless Initialize was asked for telemetry
+    if isinstance(timer, StageHistograms):
+        return timer.report()
+    return None
+
+
+def DebugFrame(frame):
+    # Processed size copy of a raw frame for the debug view
+    frame = cv2.resize(frame, (int(frame.shape[1] * SCALE), int(frame.shape[0] * SCALE)))
+    return cv2.flip(frame, FLIP) if FLIP is not None else frame
+
+
+def CountFrame(frame_shape, colour_pixels):
+    # Adds a raw frame of frame_shape to roi_stats, of which colour_pixels
+    # processed pixels were colour converted
+    frame_pixels = int(frame_shape[0] * SCALE) * int(frame_shape[1] * SCALE)
+    roi_stats['frames']             += 1
+    roi_stats['frame_pixels']       += frame_pixels
+    roi_stats['colour_pixels']      += colour_pixels
+    roi_stats['class_frame_pixels'] += frame_pixels * len(DETECTION_CLASSES)
+
+
+def ProcessFrame(frame):
+    # Runs full detection on a raw camera frame. Returns the processed frame,
+    # the detections and the processed-frame coordinates of its top left corner.
+    timer.start()
+
+    # Only convert the part of the frame the scheduled classes look at
+    classes = NextClasses()
+    if len(classes) == 0:
+        timer.finish()
+        return frame, [], (0, 0)
+
+    roi = UnionRoi(classes)
+    raw_shape = frame.shape
+    frame, hsv_stream, origin, capsize = Preprocess(frame, roi)
+    CountFrame(raw_shape, hsv_stream.shape[0] * hsv_stream.shape[1])
+
+    detections = Detect(hsv_stream, roi, origin, capsize, classes)
+    timer.finish()
+    return frame, detections, origin
             
 
 if __name__ == "__main__":
-    cap = Initialize()
-    current = True
-    while current:
-        Objectarray = ObjectDetection(cap)
-    
-        if (len(Objectarray)!=0):
-            print(Objectarray[0].type)
-    
-
-
-
-
-
-        if cv2.waitKey(20) & 0xFF == ord('q'):
-            current = False
-
-
-
+    cap = Initialize(debug=True)
+    try:
+        while True:
+            Objectarray = ObjectDetection(cap)
+
+            if (len(Objectarray)!=0):
+                print(Objectarray[0].type)
+    except KeyboardInterrupt:
+        print('ROI savings (colour, blobs): {}'.format(RoiSavings()))
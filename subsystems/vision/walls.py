@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+# Defaults in processed pixels at vision.BASE_SCALE
+COLUMN_STEP     = 4    # Scan every n-th column
+MIN_HEIGHT      = 10   # Shortest run of wall pixels a column must contain
+MAX_JUMP        = 8    # Boundary row change that splits two walls
+EPSILON         = 3    # Allowed deviation of the boundary from its segments
+MIN_AREA        = 2000 # Wall pixels a run of columns must cover
+MIN_LENGTH      = 20   # Shortest segment kept
+
+# (N, 2, 2) array of segments, each a pair of (column, row) endpoints
+NO_SEGMENTS = np.zeros((0, 2, 2), dtype=np.int32)
+
+
+def ColumnBoundary(mask, step=COLUMN_STEP, min_height=MIN_HEIGHT):
+    '''
+    Scans a wall mask column by column. Returns the columns that contain
+    wall, the row where the wall meets the floor (its lowest pixel) in each
+    and the wall's height in pixels there.
+    '''
+    wall    = mask[:, ::step] > 127
+    rows    = wall.shape[0]
+    top     = wall.argmax(axis=0)
+    bottom  = rows - 1 - wall[::-1].argmax(axis=0)
+    height  = bottom - top + 1
+    keep    = wall.any(axis=0) & (height >= min_height)
+    columns = np.arange(0, mask.shape[1], step)
+    return columns[keep], bottom[keep], height[keep]
+
+
+def FitSegments(columns, rows, heights, step=COLUMN_STEP, max_jump=MAX_JUMP, epsilon=EPSILON,
+                min_area=MIN_AREA, min_length=MIN_LENGTH):
+    '''
+    Splits the boundary into runs wherever a column is missing or the row
+    jumps, then simplifies each run into line segments with approxPolyDP.
+    Runs covering less than min_area wall pixels, such as shadows and
+    small dark patches, and segments shorter than min_length are dropped.
+    '''
+    if len(columns) < 2:
+        return NO_SEGMENTS
+
+    breaks   = np.flatnonzero((np.diff(columns) > step) | (np.abs(np.diff(rows)) > max_jump)) + 1
+    segments = []
+    for run_columns, run_rows, run_heights in zip(*[ np.split(a, breaks) for a in (columns, rows, heights) ]):
+        if len(run_columns) < 2 or run_heights.sum() * step < min_area:
+            continue
+        curve    = np.stack([ run_columns, run_rows ], axis=1).astype(np.int32).reshape(-1, 1, 2)
+        vertices = cv2.approxPolyDP(curve, epsilon, False).reshape(-1, 2)
+        run      = np.stack([ vertices[:-1], vertices[1:] ], axis=1)
+        length   = np.hypot(*(run[:, 1] - run[:, 0]).T)
+        segments.append(run[length >= min_length])
+
+    if len(segments) == 0:
+        return NO_SEGMENTS
+    return np.concatenate(segments)
+
+
+def ClosestPoint(distance, bearing):
+    '''
+    distance and bearing are (N, 2) endpoint arrays in cm and degrees.
+    Returns the distance and bearing to the nearest point on each segment and
+    how squarely the rover faces each segment, in degrees. Like a blob's
+    orientation that is 90 for a wall straight across the rover's path and 0
+    for one running alongside it.
+    '''
+    theta  = np.radians(bearing)
+    x, y   = distance * np.cos(theta), distance * np.sin(theta)
+    dx, dy = x[:, 1] - x[:, 0], y[:, 1] - y[:, 0]
+    length = dx * dx + dy * dy
+
+    # Project the rover onto each segment, clamped to its endpoints
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(-(x[:, 0] * dx + y[:, 0] * dy) / length, 0, 1)
+    t  = np.where(length > 0, t, 0)
+    px = x[:, 0] + t * dx
+    py = y[:, 0] + t * dy
+
+    direction = np.degrees(np.arctan2(dy, dx)) % 180
+    facing    = 90 - np.abs(direction - 90)
+    return np.hypot(px, py), np.degrees(np.arctan2(py, px)), facing
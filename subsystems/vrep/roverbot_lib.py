@@ -35,6 +35,7 @@ class VREP_RoverRobot(object):
 		# VREP Object Handle Variables
 		self.robotHandle = None
 		self.cameraHandle = None
+		self.cameraStreaming = False
 		self.leftMotorHandle = None 		# left and right used for differential drive
 		self.rightMotorHandle = None
 		self.v60MotorHandle = None 			# 60, 180, 300 used for omni drive
@@ -106,7 +107,7 @@ class VREP_RoverRobot(object):
 		vrep.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, vrep.simx_opmode_streaming)
 		vrep.simxGetObjectPosition(self.clientID, self.landerHandle, -1, vrep.simx_opmode_streaming)
 		
-		res,resolution,image=vrep.simxGetVisionSensorImage(self.clientID,self.cameraHandle,0,vrep.simx_opmode_streaming)
+		self.StartCameraStreaming()
 
 
 		for handle in self.obstacleHandles:
@@ -138,6 +139,8 @@ class VREP_RoverRobot(object):
 		vrep.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, vrep.simx_opmode_discontinue)
 		vrep.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, vrep.simx_opmode_discontinue)
 		vrep.simxGetObjectPosition(self.clientID, self.landerHandle, -1, vrep.simx_opmode_discontinue)
+		vrep.simxGetVisionSensorImageArray(self.clientID, self.cameraHandle, 0, vrep.simx_opmode_discontinue)
+		self.cameraStreaming = False
 
 		for handle in self.obstacleHandles:
 			vrep.simxGetObjectPosition(self.clientID, handle, -1, vrep.simx_opmode_discontinue)
@@ -232,18 +235,30 @@ class VREP_RoverRobot(object):
 		return sampleRangeBearing, landerRangeBearing, obstaclesRangeBearing, rocksRangeBearing
 
 
+	# Starts streaming the vision sensor. Only needed once, later reads come from the buffer.
+	def StartCameraStreaming(self):
+		if self.cameraStreaming or self.cameraHandle == None:
+			return
+		vrep.simxGetVisionSensorImageArray(self.clientID,self.cameraHandle,0,vrep.simx_opmode_streaming)
+		self.cameraStreaming = True
+
+	# Gets the latest streamed camera image
+	# returns:
+	#	resolution - [width, height] of the image, None if no image has arrived yet
+	#	image - (height, width, 3) RGB NumPy array with rows bottom-up. It views the remote API's
+	#		buffer, so it is only valid until the next call.
 	def GetCameraImage(self):
 
 		if self.cameraHandle == None:
-			None, None
-	
-		res,resolution,image=vrep.simxGetVisionSensorImage(self.clientID,self.cameraHandle,0,vrep.simx_opmode_buffer)
+			return None, None
+
+		self.StartCameraStreaming()
+		res,resolution,image=vrep.simxGetVisionSensorImageArray(self.clientID,self.cameraHandle,0,vrep.simx_opmode_buffer)
 		
 		if res==vrep.simx_return_ok:
 			return resolution, image    
 		else:
 			return None, None
-			# res=vrep.simxSetVisionSensorImage(clientID,v1,image,0,vrep.simx_opmode_oneshot)
 	
 	# Gets the Range and Bearing to the wall(s)
 	# returns:
@@ -284,6 +284,28 @@ def simxGetVisionSensorImage(clientID, sensorHandle, options, operationMode):
             reso.append(resolution[i])
     return ret, reso, image
 
+def simxGetVisionSensorImageArray(clientID, sensorHandle, options, operationMode):
+    '''
+    Same as simxGetVisionSensorImage but returns the image as a (height, width, bytesPerPixel)
+    uint8 NumPy array that views the remote API's buffer instead of a list. The buffer belongs
+    to the remote API and is overwritten by the next call for this sensor, so copy the array
+    if it has to outlive that. Rows are bottom-up, as V-REP stores them.
+    '''
+    import numpy as np
+
+    resolution = (ct.c_int*2)()
+    c_image  = ct.POINTER(ct.c_byte)()
+    bytesPerPixel = 3
+    if (options and 1) != 0:
+        bytesPerPixel = 1
+    ret = c_GetVisionSensorImage(clientID, sensorHandle, resolution, ct.byref(c_image), options, operationMode)
+
+    if (ret != 0):
+        return ret, [], None
+    pixels = ct.cast(c_image, ct.POINTER(ct.c_ubyte))
+    image  = np.ctypeslib.as_array(pixels, shape=(resolution[1], resolution[0], bytesPerPixel))
+    return ret, [resolution[0], resolution[1]], image
+
 def simxSetVisionSensorImage(clientID, sensorHandle, image, options, operationMode):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
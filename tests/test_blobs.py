@@ -0,0 +1,70 @@
+import numpy as np
+
+from subsystems.vision.blobs import Blobs, ContourBlobs, ExtractBlobs, FilterBlobs, TranslateBlobs
+
+
+def make_blobs(rows):
+    # rows of (x, y, w, h, area)
+    x, y, w, h, area = [ np.array(col, dtype=np.int32) for col in zip(*rows) ]
+    return Blobs(x, y, w, h, area, x + w / 2, y + h / 2)
+
+
+def test_filter_min_size():
+    blobs = make_blobs([ (0, 0, 10, 10, 100), (0, 0, 3, 10, 30), (0, 0, 10, 3, 30) ])
+    kept  = FilterBlobs(blobs, min_size=5)
+    assert kept.w.tolist() == [ 10 ]
+    assert kept.h.tolist() == [ 10 ]
+
+
+def test_filter_min_extent():
+    # A diagonal line fills little of its bounding box
+    blobs = make_blobs([ (0, 0, 10, 10, 80), (0, 0, 10, 10, 10) ])
+    assert FilterBlobs(blobs, min_extent=0.5).area.tolist() == [ 80 ]
+
+
+def test_filter_min_area_is_exclusive():
+    blobs = make_blobs([ (0, 0, 10, 10, 50), (0, 0, 10, 10, 51) ])
+    assert FilterBlobs(blobs, min_area=50).area.tolist() == [ 51 ]
+
+
+def test_filter_horizon():
+    # Kept only if the bottom edge is below the horizon row
+    blobs = make_blobs([ (0, 0, 10, 10, 100), (0, 5, 10, 10, 100), (0, 6, 10, 10, 100) ])
+    assert FilterBlobs(blobs, horizon=15).y.tolist() == [ 6 ]
+
+
+def test_filter_keeps_fields_aligned():
+    blobs = make_blobs([ (1, 2, 10, 10, 100), (3, 4, 2, 2, 4), (5, 6, 10, 10, 90) ])
+    kept  = FilterBlobs(blobs, min_size=5)
+    assert kept.x.tolist() == [ 1, 5 ]
+    assert kept.cx.tolist() == [ 6, 10 ]
+    assert kept.cy.tolist() == [ 7, 11 ]
+
+
+def test_filter_empty():
+    blobs = make_blobs([ (0, 0, 1, 1, 1) ])
+    kept  = FilterBlobs(blobs, min_size=5)
+    assert all(len(field) == 0 for field in kept)
+
+
+def test_extract_and_translate():
+    mask = np.zeros((20, 30), dtype=np.uint8)
+    mask[2:6, 3:10]    = 255
+    mask[10:18, 20:24] = 255
+    blobs = ExtractBlobs(mask)
+    order = np.argsort(blobs.x)
+    assert blobs.x[order].tolist() == [ 3, 20 ]
+    assert blobs.w[order].tolist() == [ 7, 4 ]
+    assert blobs.area[order].tolist() == [ 28, 32 ]
+    moved = TranslateBlobs(blobs, 5, 7)
+    assert (moved.x - blobs.x).tolist() == [ 5, 5 ]
+    assert np.allclose(moved.cy - blobs.cy, 7)
+    assert TranslateBlobs(blobs, 0, 0) is blobs
+
+
+def test_contour_blobs():
+    mask = np.zeros((20, 30), dtype=np.uint8)
+    mask[2:6, 3:10] = 255
+    blobs = ContourBlobs(mask)
+    assert (blobs.x.tolist(), blobs.y.tolist(), blobs.w.tolist(), blobs.h.tolist()) == ([ 3 ], [ 2 ], [ 7 ], [ 4 ])
+    assert len(ContourBlobs(np.zeros((20, 30), dtype=np.uint8)).x) == 0
@@ -0,0 +1,41 @@
+import numpy as np
+
+from subsystems.vision import vision
+from subsystems.vision.capture import FrameGrabber
+from subsystems.vision.sources import RawFileSource
+
+
+def write_frames(tmp_path, count):
+    # Frame i is filled with i
+    path = str(tmp_path / 'frames.npy')
+    np.save(path, np.repeat(np.arange(count, dtype=np.uint8), 4 * 6 * 3).reshape(count, 4, 6, 3))
+    return path
+
+
+def test_file_source_is_not_threaded(tmp_path):
+    # Every frame of a file is read in order, then it ends
+    cap = vision.Initialize(write_frames(tmp_path, 5))
+    assert not isinstance(cap, FrameGrabber)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(int(frame[0, 0, 0]))
+    assert frames == [ 0, 1, 2, 3, 4 ]
+
+
+def test_grabber_ends_with_file(tmp_path):
+    # Frames may be dropped, but no frame is returned twice and reads fail
+    # once the file is done
+    grabber = FrameGrabber(RawFileSource(write_frames(tmp_path, 2)), live=False).start()
+    frames  = []
+    for _ in range(10):
+        ret, frame = grabber.read(timeout=1)
+        if not ret:
+            break
+        frames.append(int(frame[0, 0, 0]))
+    assert grabber.eof
+    assert 1 <= len(frames) <= 2
+    assert frames == sorted(set(frames))
+    assert grabber.read() == (False, None)
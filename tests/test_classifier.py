@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from subsystems.vision.classifier import MAX_RANGES, ColourClassifier
+
+
+def hsv_image(pixels):
+    return np.array([ pixels ], dtype=np.uint8)
+
+
+def test_classify_ranges():
+    classifier = ColourClassifier([ (1, [ ((0, 100, 100), (10, 255, 255)) ]),
+                                    (2, [ ((100, 50, 50), (120, 255, 255)),
+                                          ((170, 50, 50), (179, 255, 255)) ]) ])
+    hsv    = hsv_image([ (5, 200, 200), (10, 255, 255), (11, 200, 200), (0, 99, 200),
+                         (110, 60, 60), (175, 60, 60), (130, 60, 60) ])
+    labels = classifier.classify(hsv)
+    assert labels.dtype == np.uint8
+    assert labels.tolist() == [ [ 1, 1, 0, 0, 2, 2, 0 ] ]
+
+
+def test_first_class_wins_overlap():
+    classifier = ColourClassifier([ (3, [ ((0, 0, 0), (20, 255, 255)) ]),
+                                    (4, [ ((10, 0, 0), (30, 255, 255)) ]) ])
+    labels = classifier.classify(hsv_image([ (5, 9, 9), (15, 9, 9), (25, 9, 9) ]))
+    assert labels.tolist() == [ [ 3, 3, 4 ] ]
+
+
+def test_classify_matches_in_range():
+    # Same result as testing each range separately
+    ranges     = [ (1, [ ((0, 80, 60), (15, 255, 255)) ]), (2, [ ((40, 30, 30), (90, 200, 220)) ]) ]
+    classifier = ColourClassifier(ranges)
+    rng = np.random.default_rng(0)
+    hsv = np.stack([ rng.integers(0, 180, (40, 50)),
+                     rng.integers(0, 256, (40, 50)),
+                     rng.integers(0, 256, (40, 50)) ], axis=-1).astype(np.uint8)
+    expected = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    for label, class_ranges in reversed(ranges):
+        for lo, hi in class_ranges:
+            inside = np.all((hsv >= lo) & (hsv <= hi), axis=-1)
+            expected[inside] = label
+    out = np.empty(hsv.shape[:2], dtype=np.uint8)
+    assert classifier.classify(hsv, out) is out
+    assert np.array_equal(out, expected)
+
+
+def test_masks():
+    classifier = ColourClassifier([ (1, []), (2, []), (5, []) ])
+    labels = np.array([ [ 0, 1, 2 ], [ 5, 5, 1 ] ], dtype=np.uint8)
+    masks  = classifier.masks(labels)
+    assert sorted(masks) == [ 1, 2, 5 ]
+    assert masks[1].tolist() == [ [ 0, 255, 0 ], [ 0, 0, 255 ] ]
+    assert masks[2].tolist() == [ [ 0, 0, 255 ], [ 0, 0, 0 ] ]
+    assert masks[5].tolist() == [ [ 0, 0, 0 ], [ 255, 255, 0 ] ]
+    assert all(mask.flags['C_CONTIGUOUS'] for mask in masks.values())
+
+
+def test_masks_for_some_classes():
+    classifier = ColourClassifier([ (1, []), (2, []), (5, []) ])
+    labels = np.array([ [ 0, 1, 2 ], [ 5, 5, 1 ] ], dtype=np.uint8)
+    out    = np.empty((1, 2, 3), dtype=np.uint8)
+    masks  = classifier.masks(labels, [ 5 ], out)
+    assert list(masks) == [ 5 ]
+    assert np.shares_memory(masks[5], out)
+    assert masks[5].tolist() == [ [ 0, 0, 0 ], [ 255, 255, 0 ] ]
+
+
+def test_too_many_ranges():
+    ranges = [ ((i, 0, 0), (i, 255, 255)) for i in range(MAX_RANGES + 1) ]
+    with pytest.raises(ValueError):
+        ColourClassifier([ (1, ranges) ])
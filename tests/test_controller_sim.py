@@ -0,0 +1,27 @@
+import math
+
+from controller_sim import to_detected_objects
+from subsystems.interop import NO_TRACK, OBJECT_CODES, ObjectType
+from subsystems.navigation import env_params
+
+def test_no_objects():
+  assert len(to_detected_objects(ObjectType.SAMPLE, None, 1.0)) == 0
+  assert len(to_detected_objects(ObjectType.SAMPLE, [], 1.0)) == 0
+
+def test_object_list():
+  # The simulator gives [range in m, bearing in radians] per object
+  batch = to_detected_objects(ObjectType.ROCK, [ [ 0.5, 0 ], [ 1.2, math.pi / 6 ] ], 7.0)
+  assert batch['type'].tolist() == [ OBJECT_CODES[ObjectType.ROCK] ] * 2
+  assert batch['distance'].tolist() == [ 0.5 * env_params.meter_scale, 1.2 * env_params.meter_scale ]
+  assert abs(batch['heading'][1] - 30) < 1e-4
+  assert batch['angle'].tolist() == [ 0, 0 ]
+  assert batch['timestamp'].tolist() == [ 7.0, 7.0 ]
+  assert batch['track'].tolist() == [ NO_TRACK ] * 2
+
+def test_single_object():
+  # A lone [range, bearing] rather than a list of them
+  batch = to_detected_objects(ObjectType.LANDER, [ 2, -math.pi / 4 ], 3.0)
+  assert len(batch) == 1
+  assert batch['distance'][0] == 2 * env_params.meter_scale
+  assert abs(batch['heading'][0] + 45) < 1e-4
+  assert batch['angle'][0] == 1
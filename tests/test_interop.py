@@ -0,0 +1,31 @@
+import numpy as np
+
+from subsystems.interop import (DETECTION, NO_TRACK, OBJECT_CODES, DetectedObject, ObjectType,
+                                detection_batch, from_detection_batch, to_detection_batch)
+
+def test_detection_batch_has_no_tracks():
+  batch = detection_batch(3)
+  assert batch.dtype == DETECTION
+  assert batch['track'].tolist() == [ NO_TRACK ] * 3
+  assert len(detection_batch()) == 0
+
+def test_round_trip():
+  objects = [ DetectedObject(ObjectType.SAMPLE, 10.5, 80.25, 0),
+              DetectedObject(ObjectType.OBSTACLE, -20, 150, 1) ]
+  batch   = to_detection_batch(objects, 123.5, tracks=[ 4, NO_TRACK ])
+  assert batch['type'].tolist() == [ OBJECT_CODES[ObjectType.SAMPLE], OBJECT_CODES[ObjectType.OBSTACLE] ]
+  assert batch['timestamp'].tolist() == [ 123.5, 123.5 ]
+  assert batch['track'].tolist() == [ 4, NO_TRACK ]
+
+  back = from_detection_batch(batch)
+  assert [ (o.type, o.heading, o.distance, o.angle) for o in back ] == \
+         [ (o.type, o.heading, o.distance, o.angle) for o in objects ]
+  assert all(isinstance(o.heading, float) for o in back)
+
+def test_to_detection_batch_without_tracks():
+  batch = to_detection_batch([ DetectedObject(ObjectType.ROCK, 0, 50, 0) ], 1.0)
+  assert batch['track'].tolist() == [ NO_TRACK ]
+
+def test_from_empty_batch():
+  assert from_detection_batch(detection_batch()) == []
+  assert np.array_equal(to_detection_batch([], 0), detection_batch())
@@ -0,0 +1,43 @@
+import numpy as np
+
+from subsystems.navigation.object_filter import PositionFilter, polar_covariance
+
+def test_polar_covariance_axes():
+  # Straight ahead along x the range error is along x and the bearing error
+  # across it, scaled by the distance
+  cov = polar_covariance(100, 0, 3, 1)
+  assert np.allclose(cov, np.diag([ 9, (100 * np.radians(1)) ** 2 ]))
+  cov = polar_covariance(100, 90, 3, 1)
+  assert np.allclose(cov, np.diag([ (100 * np.radians(1)) ** 2, 9 ]))
+
+def test_polar_covariance_floors_distance():
+  cov = polar_covariance(0, 0, 3, 1)
+  assert np.linalg.det(cov) > 0
+  assert np.allclose(cov, polar_covariance(1, 0, 3, 1))
+
+def test_update_weights_by_covariance():
+  f = PositionFilter(0, 0, np.eye(2))
+  f.update(10, 20, np.eye(2))
+  assert np.allclose(f.mean, [ 5, 10 ])
+  assert np.allclose(f.cov, np.eye(2) / 2)
+
+  # A much more certain measurement dominates
+  f = PositionFilter(0, 0, np.eye(2) * 100)
+  f.update(10, 0, np.eye(2) * 0.01)
+  assert abs(f.mean[0] - 10) < 0.01
+
+def test_predict_adds_variance():
+  f = PositionFilter(1, 2, np.eye(2))
+  f.predict(3)
+  assert np.allclose(f.cov, np.eye(2) * 4)
+  assert np.allclose(f.mean, [ 1, 2 ])
+
+def test_repeated_updates_converge():
+  rng = np.random.default_rng(0)
+  cov = polar_covariance(100, 30, 3, 1.5)
+  f   = PositionFilter(0, 0, np.eye(2) * 1e6)
+  for _ in range(200):
+    x, y = rng.multivariate_normal([ 50, 80 ], cov)
+    f.update(x, y, cov)
+  assert np.allclose(f.mean, [ 50, 80 ], atol=1)
+  assert np.all(np.linalg.eigvalsh(f.cov) < np.linalg.eigvalsh(cov).max() / 100)
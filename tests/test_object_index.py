@@ -0,0 +1,66 @@
+import random
+
+from subsystems.interop import DetectedObject, ObjectType
+from subsystems.navigation.object_index import PolarGrid, polar_distance
+
+def make(distance, heading):
+  return DetectedObject(ObjectType.SAMPLE, heading, distance, 0)
+
+def test_polar_distance():
+  assert polar_distance(10, 0, 10, 0) == 0
+  assert abs(polar_distance(3, 0, 4, 90) - 5) < 1e-9
+  assert abs(polar_distance(5, 30, 5, 210) - 10) < 1e-9
+
+def test_add_remove():
+  grid = PolarGrid(10, 5)
+  a, b = make(12, 3), make(14, 4)
+  grid.add(a)
+  grid.add(b)
+  assert len(grid) == 2
+  grid.remove(a)
+  assert len(grid) == 1
+  grid.remove(b)
+  assert len(grid) == 0
+  assert grid.bands == {}
+
+def test_move_changes_cell():
+  grid = PolarGrid(10, 5)
+  o = make(12, 3)
+  grid.add(o)
+  o.distance, o.heading = 55, -20
+  grid.move(o)
+  assert grid.cell_of[o] == grid.key(55, -20)
+  assert list(grid.near(55, -20)) == [ o ]
+  assert list(grid.near(12, 3)) == []
+
+def test_near_covers_thresholds():
+  # Anything within one cell size of the query is in its neighbourhood
+  grid = PolarGrid(10, 5)
+  rng  = random.Random(0)
+  objs = [ make(rng.uniform(0, 200), rng.uniform(-90, 90)) for _ in range(300) ]
+  for o in objs:
+    grid.add(o)
+  for _ in range(100):
+    d, h = rng.uniform(0, 200), rng.uniform(-90, 90)
+    near = set(grid.near(d, h))
+    for o in objs:
+      if abs(o.distance - d) <= 10 and abs(o.heading - h) <= 5:
+        assert o in near
+
+def test_nearest_matches_brute_force():
+  grid = PolarGrid(10, 5)
+  rng  = random.Random(1)
+  objs = [ make(rng.uniform(0, 300), rng.uniform(-90, 90)) for _ in range(200) ]
+  for o in objs:
+    grid.add(o)
+  assert grid.nearest_to_rover() is min(objs, key=lambda o: o.distance)
+  for _ in range(100):
+    d, h = rng.uniform(0, 300), rng.uniform(-90, 90)
+    best = min(objs, key=lambda o: polar_distance(o.distance, o.heading, d, h))
+    assert grid.nearest(d, h) is best
+
+def test_empty():
+  grid = PolarGrid(10, 5)
+  assert grid.nearest_to_rover() is None
+  assert grid.nearest(10, 0) is None
+  assert list(grid.near(10, 0)) == []
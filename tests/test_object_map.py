@@ -0,0 +1,164 @@
+import time
+
+import numpy as np
+import pytest
+
+import config_sim
+from subsystems.interop import DetectedObject, ObjectType, to_detection_batch
+from subsystems.navigation import navigation as nav
+from subsystems.navigation.navigation import ObjectMap
+
+@pytest.fixture(autouse=True)
+def sim_config(monkeypatch):
+  monkeypatch.setattr(nav, 'cfg', config_sim)
+
+def make(type, distance, heading, last_detected):
+  o = DetectedObject(type, heading, distance, 0)
+  o.first_detected = last_detected
+  o.last_detected  = last_detected
+  return o
+
+def heap(m):
+  return m._ObjectMap__expiry
+
+def test_prune_removes_expired():
+  m   = ObjectMap()
+  now = time.time()
+  old = make(ObjectType.SAMPLE, 50, 0, now - 2 * config_sim.PRUNE_TIME)
+  new = make(ObjectType.SAMPLE, 80, 20, now)
+  m.add(old)
+  m.add(new)
+  m.prune()
+  assert list(m.objects()) == [ new ]
+  assert m.get(old.id) is None
+  assert m.get(new.id) is new
+
+def test_prune_skips_redetected():
+  # An entry pushed before the object was detected again is stale
+  m   = ObjectMap()
+  now = time.time()
+  o   = make(ObjectType.SAMPLE, 50, 0, now - 2 * config_sim.PRUNE_TIME)
+  m.add(o)
+  o.last_detected = now
+  m.schedule(o)
+  m.prune()
+  assert list(m.objects()) == [ o ]
+  assert len(heap(m)) == 1
+
+def test_prune_skips_removed():
+  m   = ObjectMap()
+  now = time.time()
+  o   = make(ObjectType.SAMPLE, 50, 0, now - 2 * config_sim.PRUNE_TIME)
+  m.add(o)
+  m.rem(o)
+  m.prune()
+  assert len(heap(m)) == 0
+  assert len(m.objects()) == 0
+
+def test_reschedule_drops_stale_entries():
+  m   = ObjectMap()
+  now = time.time()
+  o   = make(ObjectType.SAMPLE, 50, 0, now)
+  m.add(o)
+  for _ in range(10):
+    m.schedule(o)
+  assert len(heap(m)) == 11
+  m.reschedule()
+  assert len(heap(m)) == 1
+  assert heap(m)[0][2] is o
+
+def test_prune_compacts_heap():
+  m   = ObjectMap()
+  now = time.time()
+  o   = make(ObjectType.SAMPLE, 50, 0, now)
+  m.add(o)
+  for _ in range(100):
+    m.schedule(o)
+  m.prune()
+  assert len(heap(m)) == 1
+
+def test_detect_intervals_scale_expiry():
+  m   = ObjectMap()
+  now = time.time()
+  a   = make(ObjectType.SAMPLE, 50, 0, now - 2 * config_sim.PRUNE_TIME)
+  b   = make(ObjectType.ROCK, 50, 0, now - 2 * config_sim.PRUNE_TIME)
+  m.add(a)
+  m.add(b)
+  # Samples are detected every 4th frame so are kept 4 times as long, rocks
+  # are not detected at all so are never removed
+  m.set_detect_intervals({ ObjectType.SAMPLE: 4, ObjectType.ROCK: 0 })
+  m.prune()
+  assert set(m.objects()) == { a, b }
+  assert m.expiry(a) == a.last_detected + 4 * config_sim.PRUNE_TIME
+  assert len(heap(m)) == 1
+
+@pytest.fixture(params=[ True, False ], ids=[ 'hungarian', 'greedy' ])
+def solver(request, monkeypatch):
+  if request.param:
+    pytest.importorskip('scipy')
+  monkeypatch.setattr(nav, 'has_scipy', request.param)
+
+def associate(detections, known):
+  distance = np.array([ d for d, _ in detections ], dtype=np.float64)
+  heading  = np.array([ h for _, h in detections ], dtype=np.float64)
+  known    = [ make(ObjectType.SAMPLE, d, h, 0) for d, h in known ]
+  return sorted(ObjectMap.associate(distance, heading, known))
+
+def test_associate_nothing_known(solver):
+  assert associate([ (50, 0) ], []) == []
+
+def test_associate_one_to_one(solver):
+  # Both detections are within the gate of the first object, each ends up
+  # with its own object
+  assert associate([ (50, 0), (58, 2) ], [ (52, 0), (60, 2) ]) == [ (0, 0), (1, 1) ]
+
+def test_associate_gate_is_the_is_same_box(solver):
+  # A corner of the box is within the gate
+  assert associate([ (58, 4) ], [ (50, 0) ]) == [ (0, 0) ]
+  assert associate([ (60, -5) ], [ (50, 0) ]) == [ (0, 0) ]
+  # Just outside either side
+  assert associate([ (61, 0) ], [ (50, 0) ]) == []
+  assert associate([ (50, 5.5) ], [ (50, 0) ]) == []
+
+def detect(m, detections, tracks=None):
+  objects = [ DetectedObject(ObjectType.SAMPLE, h, d, 0) for d, h in detections ]
+  m.update(to_detection_batch(objects, time.time(), tracks))
+
+def test_update_associates_within_is_same_box(solver):
+  # Off in both range and heading, but still the same object
+  m = ObjectMap()
+  detect(m, [ (50, 0) ])
+  first = next(iter(m.objects()))
+  detect(m, [ (58, 4) ])
+  assert list(m.objects()) == [ first ]
+  assert (first.distance, first.heading) == (58, 4)
+
+def test_update_adds_detection_outside_gate(solver):
+  m = ObjectMap()
+  detect(m, [ (50, 0) ])
+  first = next(iter(m.objects()))
+  detect(m, [ (62, 0) ])
+  assert len(m.objects()) == 2
+  assert m.get(first.id) is first
+
+def test_update_keeps_ids(solver):
+  m = ObjectMap()
+  detect(m, [ (50, 0), (100, 20) ])
+  ids = { o.id: (o.distance, o.heading) for o in m.objects() }
+  detect(m, [ (102, 21), (52, 1) ])
+  assert { o.id: (o.distance, o.heading) for o in m.objects() } == \
+         { id: (d + 2, h + 1) for id, (d, h) in ids.items() }
+
+def test_update_drops_duplicate_in_batch(solver):
+  m = ObjectMap()
+  detect(m, [ (50, 0), (51, 1) ])
+  assert len(m.objects()) == 1
+
+def test_update_follows_track(solver):
+  # A tracked detection updates its object however far it moved
+  m = ObjectMap()
+  detect(m, [ (50, 0) ], tracks=[ 7 ])
+  o = next(iter(m.objects()))
+  detect(m, [ (90, 30) ], tracks=[ 7 ])
+  assert list(m.objects()) == [ o ]
+  assert (o.distance, o.heading, o.track) == (90, 30, 7)
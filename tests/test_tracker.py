@@ -0,0 +1,21 @@
+from subsystems.interop import ObjectType
+from subsystems.vision.tracker import MergeWindows, Tracker
+from subsystems.vision.vision import Detection
+
+
+def test_merge_windows_chains_overlaps():
+    # The third box joins the first two, the last stays apart
+    merged = MergeWindows([ (0, 0, 10, 10), (20, 20, 30, 30), (5, 5, 25, 25), (100, 100, 110, 110) ])
+    assert sorted((box, sorted(members)) for box, members in merged) == \
+        [ ((0, 0, 30, 30), [ 0, 1, 2 ]), ((100, 100, 110, 110), [ 3 ]) ]
+
+
+def test_merge_windows_touching_stay_apart():
+    merged = MergeWindows([ (0, 0, 10, 10), (10, 0, 20, 10) ])
+    assert len(merged) == 2
+
+
+def test_window_is_clipped_to_frame():
+    tracker   = Tracker(margin=0.5)
+    detection = Detection(ObjectType.SAMPLE, 5, 100, 20, 10, 0, 0, 0)
+    assert tracker.window(detection, 120, 160) == (0, 90, 35, 120)
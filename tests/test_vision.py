@@ -0,0 +1,28 @@
+import cv2
+import numpy as np
+import pytest
+
+from subsystems.vision import vision
+from subsystems.vision.vision import CropSource, Roi
+
+
+@pytest.mark.parametrize('flip', [ None, 0, 1, -1 ])
+@pytest.mark.parametrize('roi', [ Roi(0, 0, 0), Roi(10, 0, 0), Roi(5, 7, 3, 2), Roi(0, 20, 0, 15) ])
+def test_crop_source_matches_flipped_roi(monkeypatch, flip, roi):
+    # Cropping the raw frame then flipping gives the ROI of the flipped frame
+    monkeypatch.setattr(vision, 'FLIP', flip)
+    frame = np.arange(40 * 60 * 3, dtype=np.uint16).reshape(40, 60, 3)
+    crop  = CropSource(frame, roi)
+    shown = frame if flip is None else cv2.flip(frame, flip)
+    if flip is not None:
+        crop = cv2.flip(np.ascontiguousarray(crop), flip)
+    expected = shown[roi.top:40 - roi.bottom, roi.left:60 - roi.right]
+    assert np.array_equal(crop, expected)
+
+
+def test_crop_source_is_a_view(monkeypatch):
+    monkeypatch.setattr(vision, 'FLIP', -1)
+    frame = np.zeros((40, 60, 3), dtype=np.uint8)
+    crop  = CropSource(frame, Roi(5, 7, 3, 2))
+    assert crop.shape == (33, 50, 3)
+    assert np.shares_memory(crop, frame)